@@ -0,0 +1,352 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Whole-program translation of MEPA into one Python function ("AOT").    #
+#                                                                        #
+# Only the global-level subset produced for Tascal programs is accepted  #
+# (see SUBSET).  The stack depth must be known statically at every       #
+# instruction, so that each memory cell M[j] becomes a local variable    #
+# 'mj' of the generated function.  Basic blocks become straight-line     #
+# code; jumps assign the next block number 'b' and a binary if-tree      #
+# inside a 'while' loop switches among blocks.                           #
+#                                                                        #
+# In this subset every defined value has type 0 (integer), so type tags  #
+# are not kept; the only illegal values are undefined cells (None).      #
+# Each generated line records its MEPA address, so that errors are       #
+# reported for the same instruction as in mepa_interp.py.  Instructions  #
+# are counted once per block; a block that could reach the limit runs a  #
+# copy of its code which counts every instruction.                       #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+from mepa_defs import *
+
+SUBSET = [ "init", "alloc", "dealloc", "ldct", "ldvl", "stvl",
+           "add", "subt", "mult", "divi", "inv",
+           "andd", "orr", "nott",
+           "less", "grt", "eql", "dif", "leq", "geq",
+           "jmp", "jmpf", "read", "writ", "nop", "halt" ]
+
+BINOPS = {
+          "add":  "%s + %s",
+          "subt": "%s - %s",
+          "mult": "%s * %s",
+          "divi": "%s // %s",
+          "andd": "%s and %s",
+          "orr":  "%s or %s",
+          "less": "%s < %s",
+          "grt":  "%s > %s",
+          "eql":  "%s == %s",
+          "dif":  "%s != %s",
+          "leq":  "%s <= %s",
+          "geq":  "%s >= %s",
+         }
+
+# Operations that do not fail by themselves on None
+NONE_SAFE = [ "andd", "orr", "eql", "dif", "jmpf" ]
+
+class ProgEnd(Exception):
+    pass
+
+#======================================================================
+# Analysis
+#======================================================================
+
+def decodeSubset(P):
+    """ Returns [(name,args)] or None if program is outside the subset. """
+    code = []
+    for p in P:
+        name = INSTR_DICT[p[1].upper()]
+        if name not in SUBSET:
+            return None
+        args = tuple(p[2])
+        if name in ("ldvl","stvl") and (args[0]!=0 or args[1]<0):
+            return None
+        code.append((name,args))
+    return code
+
+def effect(name,args,s):
+    """ Returns (new depth, memory cells accessed) of an instruction
+        executed with stack top 's'.
+    """
+    if name=="init":
+        return -1, []
+    elif name=="alloc":
+        return s+args[0], []
+    elif name=="dealloc":
+        return s-args[0], []
+    elif name in ("ldct","read"):
+        return s+1, [s+1]
+    elif name=="ldvl":
+        return s+1, [s+1,args[1]]
+    elif name=="stvl":
+        return s-1, [s,args[1]]
+    elif name in BINOPS:
+        return s-1, [s-1,s]
+    elif name in ("inv","nott"):
+        return s, [s]
+    elif name in ("writ","jmpf"):
+        return s-1, [s]
+    else:   # jmp, nop, halt
+        return s, []
+
+def successors(code,pc):
+    name, args = code[pc]
+    if name=="halt":
+        return []
+    elif name=="jmp":
+        return [args[0]]
+    elif name=="jmpf":
+        return [pc+1,args[0]]
+    else:
+        return [pc+1]
+
+def depths(code,size):
+    """ Static stack depth before every reachable instruction, or None
+        when it is not unique or memory is accessed out of bounds.
+    """
+    S = [None]*(len(code)+1)
+    S[0] = -1
+    work = [0]
+    while work:
+        pc = work.pop()
+        if pc>=len(code):
+            continue
+        name, args = code[pc]
+        if pc==0 and name!="init":
+            return None     # display must be initialized by INPP
+        s, cells = effect(name,args,S[pc])
+        for c in cells:
+            if c<0 or c>=size:
+                return None
+        for q in successors(code,pc):
+            if q<0 or q>len(code):
+                return None
+            if S[q] is None:
+                S[q] = s
+                work.append(q)
+            elif S[q]!=s:
+                return None
+    return S
+
+def blocks(code,S):
+    """ Leaders of reachable basic blocks. """
+    leaders = set([0])
+    for pc in range(len(code)):
+        if S[pc] is None:
+            continue
+        name, args = code[pc]
+        if name in ("jmp","jmpf","halt"):
+            leaders.add(pc+1)
+        if name in ("jmp","jmpf"):
+            leaders.add(args[0])
+    return sorted(q for q in leaders if S[q] is not None)
+
+#======================================================================
+# Code generation
+#======================================================================
+
+class Emitter:
+    """ Source lines and their MEPA addresses. """
+
+    def __init__(self):
+        self.lines = []
+        self.addr = {}
+
+    def emit(self,ind,text,pc=None):
+        self.lines.append("    "*ind + text)
+        if pc is not None:
+            self.addr[len(self.lines)] = pc
+
+def genCount(em,ind,halt=False):
+    em.emit(ind,"count += 1")
+    if not halt:
+        em.emit(ind,"if count >= stop: stop = checkpoint(count)")
+
+def genInstr(em,ind,code,pc,s,blk,known,counting):
+    """ Generates one instruction; 'known' is the set of cells that
+        surely do not hold None; 'counting' adds the limit test.
+        Returns False if control does not fall through.
+    """
+    name, args = code[pc]
+    if name in NONE_SAFE:
+        opnds = [s] if name=="jmpf" else [s-1,s]
+        tests = ["m%d is None" % c for c in opnds if c not in known]
+        if tests:
+            em.emit(ind,"if %s: raise TypeError" % " or ".join(tests),pc)
+    if counting and name in ("jmp","jmpf","halt"):
+        genCount(em,ind,name=="halt")
+    if name=="ldct":
+        em.emit(ind,"m%d = %d" % (s+1,args[0]),pc)
+        known.add(s+1)
+    elif name=="ldvl":
+        em.emit(ind,"m%d = m%d" % (s+1,args[1]),pc)
+        if args[1] in known:
+            known.add(s+1)
+        else:
+            known.discard(s+1)
+    elif name=="stvl":
+        em.emit(ind,"m%d = m%d" % (args[1],s),pc)
+        if s in known:
+            known.add(args[1])
+        else:
+            known.discard(args[1])
+    elif name in BINOPS:
+        em.emit(ind,"m%d = " % (s-1) +
+                BINOPS[name] % ("m%d" % (s-1),"m%d" % s),pc)
+        known.add(s-1)
+    elif name=="inv":
+        em.emit(ind,"m%d = -m%d" % (s,s),pc)
+    elif name=="nott":
+        em.emit(ind,"m%d = 1-m%d" % (s,s),pc)
+    elif name=="read":
+        em.emit(ind,"m%d = read()" % (s+1),pc)
+        known.add(s+1)
+    elif name=="writ":
+        em.emit(ind,'write("%%d\\n" %% m%d)' % s,pc)
+    elif name=="jmp":
+        em.emit(ind,"b = %d" % blk[args[0]],pc)
+        return False
+    elif name=="jmpf":
+        em.emit(ind,"b = %d if m%d else %d" % (blk[pc+1],s,blk[args[0]]),pc)
+        return False
+    elif name=="halt":
+        em.emit(ind,"return count",pc)
+        return False
+    # init, alloc, dealloc, nop: no code
+    if counting:
+        genCount(em,ind)
+    return True
+
+def genBody(em,ind,code,S,blk,start,end,counting):
+    known = set()
+    falls = True
+    for pc in range(start,end):
+        falls = genInstr(em,ind,code,pc,S[pc],blk,known,counting)
+    if falls:
+        em.emit(ind,"b = %d" % blk[end])
+
+def genBlock(em,ind,code,S,blk,start,end):
+    """ Fast copy of a block when it cannot reach the next checkpoint
+        (see MepaVM.checkpoint), otherwise a copy counting every
+        instruction.
+    """
+    n = end-start
+    if code[end-1][0]=="halt":
+        em.emit(ind,"if count+%d <= stop:" % n)
+    else:
+        em.emit(ind,"if count+%d < stop:" % n)
+    em.emit(ind+1,"count += %d" % n)
+    genBody(em,ind+1,code,S,blk,start,end,False)
+    em.emit(ind,"else:")
+    genBody(em,ind+1,code,S,blk,start,end,True)
+
+def genSwitch(em,ind,code,S,blk,leaders,lo,hi):
+    """ Binary if-tree over blocks lo..hi-1. """
+    if hi-lo==1:
+        start = leaders[lo]
+        if start==len(code):
+            em.emit(ind,"raise ProgEnd")
+        else:
+            end = start+1
+            while end<len(code) and end not in blk and \
+                  code[end-1][0] not in ("jmp","jmpf","halt"):
+                end += 1
+            genBlock(em,ind,code,S,blk,start,end)
+        return
+    mid = (lo+hi)//2
+    em.emit(ind,"if b < %d:" % mid)
+    genSwitch(em,ind+1,code,S,blk,leaders,lo,mid)
+    em.emit(ind,"else:")
+    genSwitch(em,ind+1,code,S,blk,leaders,mid,hi)
+
+def translate(P,size):
+    """ Generates Python source of function 'run' for program P.
+        Returns (source, MEPA address of each source line) or None if P
+        is outside the supported subset.
+    """
+    code = decodeSubset(P)
+    if not code:
+        return None
+    S = depths(code,size)
+    if S is None:
+        return None
+    leaders = blocks(code,S)
+    if S[len(code)] is not None and leaders[-1]!=len(code):
+        leaders.append(len(code))     # falls off the program end
+    blk = {}
+    for k in range(len(leaders)):
+        blk[leaders[k]] = k
+    cells = set()
+    for pc in range(len(code)):
+        if S[pc] is not None:
+            cells.update(effect(code[pc][0],code[pc][1],S[pc])[1])
+    em = Emitter()
+    em.emit(0,"def run(read, write, checkpoint):")
+    if cells:
+        em.emit(1," = ".join("m%d" % c for c in sorted(cells)) + " = None")
+    em.emit(1,"count = 0")
+    em.emit(1,"stop = checkpoint(count)")
+    em.emit(1,"b = 0")
+    em.emit(1,"while True:")
+    genSwitch(em,2,code,S,blk,leaders,0,len(leaders))
+    return "\n".join(em.lines)+"\n", em.addr
+
+def compileProgram(P,size):
+    """ Returns (code object, line addresses) or None. """
+    t = translate(P,size)
+    if t is None:
+        return None
+    src, addr = t
+    return compile(src,"<mepa-aot>","exec"), addr
+
+#======================================================================
+# Execution
+#======================================================================
+
+def execute(vm,compiled=None):
+    """ Main execution function for translated programs of MepaVM
+        object 'vm'; 'compiled' is the result of compileProgram(vm.P).
+    """
+    opts = vm.options
+    Msg = vm.Msg
+
+    if compiled is None:
+        compiled = compileProgram(vm.P,maxCells(opts))
+    co, addr = compiled
+    ns = { "ProgEnd": ProgEnd }
+    exec(co,ns)
+    run = ns["run"]
+    limit = opts["limit"]
+    token = vm.readToken
+    vm.executed = 0
+
+    def read():
+        t = token()
+        try:
+            v = int(t)
+        except:
+            Msg(ILLEGAL_INPUT_VALUE,quit=True,code=1)
+        return v
+
+    try:
+        count = run(read,vm.write,lambda count: vm.checkpoint(count,limit))
+    except ProgEnd:
+        Msg(PROG_END,quit=True,code=1)
+    except SystemExit as e:
+        sys.exit(1)
+    except:
+        pc = 0
+        tb = sys.exc_info()[2]
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename=="<mepa-aot>":
+                pc = addr.get(tb.tb_lineno,pc)
+            tb = tb.tb_next
+        Msg(ILLEGAL_VALUE % pc, quit=True)
+    vm.executed = count
+    Msg(EXECUTED_INSTRUCTIONS % count)
+    return -1
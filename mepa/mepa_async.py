@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Execution of MEPA programs as asyncio tasks, so that one event loop    #
+# may serve many programs streaming their input and output (for          #
+# instance over websockets).                                             #
+#                                                                        #
+# The machine runs in the table engine in slices of about 'quantum'      #
+# instructions (see MepaVM.slices); after each slice the output is       #
+# written and control goes back to the event loop.  When READ finds no   #
+# input, the program awaits the next line of its reader instead of       #
+# blocking the process.                                                  #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, asyncio
+
+AsyncUsage = """
+Usage:
+
+    [python3] mepa_async.py
+         [--lang pt|en (pt)]
+         <program file>
+
+    Runs program as an asyncio task over standard input and output:
+
+         mepa_async.py ../testes/arquivos_mepacal/P10.mepacal < entrada
+"""
+
+if __name__ == "__main__":
+    # mepa_defs chooses the language when imported
+    import getopt
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"",["lang="])
+    except getopt.GetoptError:
+        opts, args = [], []
+    for o,a in opts:
+        if o=="--lang":
+            os.environ["MEPA_LANG"] = a
+    os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+from mepa_interp import MepaVM
+import mepa_sched
+
+# Instructions between returns to the event loop
+QUANTUM = 1000
+
+async def run(program,reader,writer,options=None,messfile=None,
+              quantum=QUANTUM):
+    """ Runs 'program', a pair (P, L) as built by inputProgram and
+        fixArgs (or loadObject), from a fresh machine state; returns the
+        status of the machine ("halt", "error" or a budget, see
+        MepaVM.run).
+
+        Input lines come from the coroutine reader.readline(), which
+        returns str or bytes, empty at end of input.  Output is given to
+        writer.write() as UTF-8 bytes, followed by writer.drain() as for
+        an asyncio.StreamWriter, or else by writer.flush() if the writer
+        has it.  Messages go to 'messfile' (default that of mepa_defs)
+        after the output of the same slice.
+    """
+    P, L = program
+    if messfile is None:
+        messfile = mepa_defs.MESS_FILE
+    inp = mepa_sched.Input()
+    out = mepa_sched.Output()
+    messages = mepa_sched.Output()
+    options = dict(options or {},interactive=True)
+    options.setdefault("engine","table")
+    vm = MepaVM(P,L,options,inp,out,messages)
+    slices = vm.slices(quantum)
+    drain = getattr(writer,"drain",None)
+    flush = getattr(writer,"flush",None)
+    while True:
+        try:
+            state = next(slices)
+        except StopIteration:
+            state = "halt"
+        except SystemExit:
+            vm.flush()
+            state = vm.status or "error"
+        text = out.take()
+        if text:
+            writer.write(text.encode("utf-8"))
+            if drain is not None:
+                await drain()
+            elif flush is not None:
+                flush()
+        text = messages.take()
+        if text:
+            messfile.write(text)
+        if state=="input":
+            line = await reader.readline()
+            if isinstance(line,bytes):
+                line = line.decode("utf-8")
+            if line:
+                inp.feed(line)
+            else:
+                inp.close()
+        elif state=="ready":
+            await asyncio.sleep(0)
+        else:
+            return state
+
+class StdinReader:
+    """ Standard input read in a thread, which may block. """
+
+    async def readline(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None,sys.stdin.readline)
+
+async def main(fname):
+    status = await run(mepa_sched.load(fname),StdinReader(),
+                       sys.stdout.buffer)
+    return 0 if status=="halt" else 1
+
+if __name__ == "__main__":
+
+    if len(args)!=1:
+        sys.stderr.write(AsyncUsage)
+        sys.exit(1)
+    sys.exit(asyncio.run(main(args[0])))
@@ -0,0 +1,245 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Batch execution of one MEPA program against many input files, as when  #
+# grading.  The program is read, verified and decoded once; worker       #
+# processes receive it once and run every case from a fresh machine      #
+# state.  One JSON line is reported per case, in the order of the input  #
+# files:                                                                 #
+#                                                                        #
+#   case          input file name                                        #
+#   status        "halt", "error", or the budget which ran out: "limit", #
+#                 "timeout" (--timeout) or "cputime" (--cputime)         #
+#   code          exit code the interpreter would return                 #
+#   instructions  executed instructions (null after an error)            #
+#   output        program output                                         #
+#   messages      interpreter messages                                   #
+#                                                                        #
+# With --lockstep the cases are first run together over NumPy arrays     #
+# (see mepa_lockstep.py); those which do not halt there are then run as  #
+# usual.                                                                 #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, io, time, getopt, json, multiprocessing
+
+BatchUsage = """
+Usage:
+
+    [python3] mepa_batch.py
+         [--lang pt|en (pt)]
+         [--workers <integer> (number of processors)]
+         [--report <file> (stdout)]
+         [--lockstep (False)]
+         [--engine eval|table|closure|aot|reg (%(engine)s)]
+         [--intwidth 32|64 (none)]
+         [--fuse (False)]
+         [--nocheck (False)]
+         [--verify (False)]
+         [--noverify (False)]
+         [--limit <integer> (%(limit)d)]
+         [--timeout <milliseconds> (none)]
+         [--cputime <milliseconds> (none)]
+         [--stacksize <integer> (%(stacksize)d)]
+         [--memlimit <integer> (%(memlimit)d)]
+         [--memstats (False)]
+         [--displaysize <integer> (%(displaysize)d)]
+         [--programsize <integer> (%(programsize)d)]
+         <program file> <input file or directory> ...
+
+    Files in a directory are taken in name order:
+
+         mepa_batch.py --engine table P10.mepacal casos/
+"""
+
+MACHINE_OPTIONS = [ "engine=", "intwidth=", "fuse", "nocheck", "verify",
+                    "noverify", "limit=", "stacksize=", "displaysize=",
+                    "programsize=", "memlimit=", "memstats", "timeout=",
+                    "cputime=" ]
+
+def usage():
+    # defaults of the machine options
+    from mepa_defs import OPTIONS_DICT
+    sys.stderr.write(BatchUsage % OPTIONS_DICT)
+    sys.exit(1)
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:],"",
+                               ["lang=","workers=","report=",
+                                  "lockstep"]+MACHINE_OPTIONS)
+except getopt.GetoptError:
+    usage()
+WORKERS = os.cpu_count() or 1
+REPORT = None
+LOCKSTEP = False
+for o,a in opts:
+    if o=="--lang":
+        os.environ["MEPA_LANG"] = a
+    elif o=="--workers":
+        try:
+            WORKERS = int(a)
+        except ValueError:
+            usage()
+    elif o=="--report":
+        REPORT = a
+    elif o=="--lockstep":
+        LOCKSTEP = True
+os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+from mepa_interp import MepaVM
+import mepa_obj
+import mepa_lockstep
+
+# Cases handed to a worker at a time
+CHUNK = 8
+
+# Machine of each worker process (see 'start')
+VM = None
+
+def load(fname):
+    """ Reads a text or precompiled program. """
+    try:
+        if mepa_obj.isObject(fname):
+            with open(fname,"rb") as f:
+                return mepa_obj.loadObject(f)
+        mepa_defs.PROG_FILE = open(fname,"r")
+    except FileNotFoundError:
+        Msg(OPEN_FILE_ERROR % fname,quit=True,code=1)
+    P, L = inputProgram()
+    mepa_defs.PROG_FILE.close()
+    fixArgs(P,L)
+    return P, L
+
+def cases(names):
+    """ Input files named in the command line. """
+    for name in names:
+        if os.path.isdir(name):
+            for f in sorted(os.listdir(name)):
+                path = os.path.join(name,f)
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield name
+
+def start(P,L,options):
+    """ Worker initialization: decodes program for all its cases. """
+    global VM
+    VM = MepaVM(P,L,options)
+    VM.prepare()
+
+def reportLine(case,status,code,instructions,output,messages):
+    """ Report line of a case, and whether program halted. """
+    return json.dumps({ "case": case,
+                        "status": status,
+                        "code": code,
+                        "instructions": instructions,
+                        "output": output,
+                        "messages": messages },
+                      ensure_ascii=False), status=="halt"
+
+def runCase(case):
+    """ Runs program on input file 'case'; returns report line and
+        whether program halted.
+    """
+    VM.outf = io.StringIO()
+    VM.messfile = io.StringIO()
+    status = "error"
+    code = 1
+    try:
+        with open(case,"r") as inf:
+            VM.inf = inf
+            code = 0 if VM.run()==-1 else 1
+            status = VM.status
+    except FileNotFoundError:
+        VM.Msg(OPEN_FILE_ERROR % case)
+    except SystemExit as e:
+        code = e.code or 0
+    return reportLine(case,status,code,
+                      VM.executed if status=="halt" else None,
+                      VM.outf.getvalue(),VM.messfile.getvalue())
+
+def lockstep(P,options,names):
+    """ Runs cases 'names' in lockstep; returns {case index: report line}
+        for those which halted.
+    """
+    if mepa_lockstep.numpy is None:
+        Msg(LOCKSTEP_NO_NUMPY)
+        return {}
+    prog = mepa_lockstep.convert(P,options)
+    if prog is None:
+        Msg(LOCKSTEP_UNSUPPORTED)
+        return {}
+    res = {}
+    for k, (count, output) in mepa_lockstep.run(prog,options,names).items():
+        res[k] = reportLine(names[k],"halt",0,count,output,
+                            EXECUTED_INSTRUCTIONS % count + "\n")
+    Msg(LOCKSTEP_SUMMARY % (len(res),len(names)-len(res)))
+    return res
+
+if __name__ == "__main__":
+
+    if len(args)<2 or WORKERS<=0:
+        usage()
+    for o,a in opts:
+        o = o[2:]
+        if o in BOOL_OPTIONS:
+            OPTIONS_DICT[o] = True
+        elif o in INT_OPTIONS:
+            try:
+                n = int(a)
+                if n<=0:
+                    raise ValueError
+                OPTIONS_DICT[o] = n
+            except ValueError:
+                Msg(ILLEGAL_OPTION % (o,a),quit=True,code=1)
+        elif o in CHOICE_OPTIONS:
+            if a not in CHOICE_OPTIONS[o]:
+                Msg(ILLEGAL_OPTION % (o,a),quit=True,code=1)
+            OPTIONS_DICT[o] = a
+
+    P, L = load(args[0])
+    vm = MepaVM(P,L,OPTIONS_DICT)
+    vm.prepare()                  # rejected programs stop here
+    options = dict(vm.options,verify=False,noverify=True)   # done once
+
+    report = open(REPORT,"w") if REPORT else sys.stdout
+    t0 = time.perf_counter()
+    total = errors = 0
+    if LOCKSTEP:
+        names = list(cases(args[1:]))
+        done = lockstep(P,options,names)
+        rest = [names[k] for k in range(len(names)) if k not in done]
+    else:
+        done = {}
+        rest = cases(args[1:])
+    if WORKERS==1:
+        start(P,L,options)
+        lines = map(runCase,rest)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(WORKERS,start,(P,L,options))
+        lines = pool.imap(runCase,rest,CHUNK)
+    while True:
+        if total in done:
+            line, halted = done[total]
+        else:
+            line, halted = next(lines,(None,None))
+            if line is None:
+                break
+        report.write(line+"\n")
+        total += 1
+        if not halted:
+            errors += 1
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if report is not sys.stdout:
+        report.close()
+    Msg(BATCH_SUMMARY % (total,errors,time.perf_counter()-t0))
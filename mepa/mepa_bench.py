@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Throughput comparison (instructions per second) of MEPA execution      #
+# engines.                                                               #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, io, time, getopt
+
+Usage = """
+Usage:
+
+    [python3] mepa_bench.py
+         [--lang pt|en (pt)]
+         [--repeat <integer> (20)]
+         [--engines <engine>,... (all)]
+         [--fuse (False)]
+         [--jit (False)]
+         <program file>[@<input>] ...
+
+    <input> is a comma separated list of integers read by the program:
+
+         mepa_bench.py ../testes/arquivos_mepacal/P10.mepacal@300
+"""
+
+def usage():
+    sys.stderr.write(Usage)
+    sys.exit(1)
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:],"",["lang=","repeat=","engines=","fuse",
+                                               "jit"])
+except getopt.GetoptError:
+    usage()
+REPEAT = 20
+ENGINES = None
+FUSE = False
+JIT = False
+for o,a in opts:
+    if o=="--lang":
+        os.environ["MEPA_LANG"] = a
+    elif o=="--repeat":
+        REPEAT = int(a)
+    elif o=="--engines":
+        ENGINES = a.split(",")
+    elif o=="--fuse":
+        FUSE = True
+    elif o=="--jit":
+        JIT = True
+os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+from mepa_interp import MepaVM
+import mepa_closure
+import mepa_aot
+import mepa_reg
+
+if ENGINES is None:
+    ENGINES = CHOICE_OPTIONS["engine"]
+
+def load(fname):
+    """ Reads and prepares a program for every engine. """
+    mepa_defs.PROG_FILE = open(fname,"r")
+    P, L = inputProgram()
+    mepa_defs.PROG_FILE.close()
+    fixArgs(P,L)
+    return P, L
+
+def prepare(vm):
+    if vm.options["engine"]=="reg":
+        return mepa_reg.convert(vm.P,maxCells(vm.options))
+    if vm.options["engine"]=="table":
+        MP = vm.decode()
+        if vm.options["fuse"]:
+            MP = vm.fuse(MP)
+        return MP
+    return makeMepa(vm.P)
+
+class Failure(Exception):
+    """ Raised with the first message of a machine stopped by an error. """
+    pass
+
+def run(engine,P,L,data,compiled=None):
+    """ Runs program once; returns (instructions, seconds, output).
+        'compiled' is the result of mepa_aot.compileProgram for engine
+        aot; decoding and translation are left out of the time.
+    """
+    inf = io.StringIO(data)
+    outf = io.StringIO()
+    messf = io.StringIO()
+    vm = MepaVM(P,L,{"engine":engine},inf,outf,messf)
+    code = compiled
+    if engine not in ("aot","closure"):
+        code = prepare(vm)
+    if code is None and engine!="closure":
+        raise Failure("program not translated")
+    try:
+        t0 = time.perf_counter()
+        vm.startIO()
+        if engine=="aot":
+            mepa_aot.execute(vm,code)
+        elif engine=="closure":
+            mepa_closure.execute(vm)
+        else:
+            vm.execute(code)
+        vm.flush()
+        t1 = time.perf_counter()
+    except SystemExit:
+        lines = [l.strip() for l in messf.getvalue().split("\n") if l.strip()]
+        raise Failure(lines[0] if lines else "")
+    return vm.executed, t1-t0, outf.getvalue()
+
+def bench(fname,data):
+    """ Returns {engine: (instructions per second, output)}, or None
+        for the engines which failed (reported on the output).
+    """
+    P, L = load(fname)
+    compiled = None
+    if "aot" in ENGINES:
+        compiled = mepa_aot.compileProgram(P,maxCells(OPTIONS_DICT))
+    results = {}
+    for engine in ENGINES:
+        count = 0
+        secs = 0.0
+        try:
+            for k in range(REPEAT):
+                n, t, out = run(engine,P,L,data,compiled)
+                count += n
+                secs += t
+            results[engine] = (count/secs, out)
+        except Failure as e:
+            print("%s: engine '%s' failed: %s" % (fname,engine,e.args[0]))
+            results[engine] = None
+    return results
+
+if __name__ == "__main__":
+
+    OPTIONS_DICT["limit"] = 10**9
+    OPTIONS_DICT["fuse"] = FUSE and not JIT
+    OPTIONS_DICT["jit"] = JIT
+    if not args:
+        usage()
+    print("%-12s %10s" % ("program","input") +
+          "".join("%14s" % ("%s i/s" % e) for e in ENGINES) +
+          "".join("%10s" % ("x" + e) for e in ENGINES[1:]))
+    for a in args:
+        fname, _, inp = a.partition("@")
+        data = "\n".join(inp.split(",")) + "\n"
+        res = bench(fname,data)
+        base = res[ENGINES[0]]
+        for e in ENGINES[1:]:
+            if base is not None and res[e] is not None and res[e][1]!=base[1]:
+                print("%s: engine '%s' output differs" % (fname,e))
+        print("%-12s %10s" % (os.path.basename(fname).split(".")[0],inp) +
+              "".join("%14.0f" % res[e][0] if res[e] is not None else
+                      "%14s" % "-" for e in ENGINES) +
+              "".join("%10.2f" % (res[e][0]/base[0])
+                      if base is not None and res[e] is not None else
+                      "%10s" % "-" for e in ENGINES[1:]))
@@ -0,0 +1,156 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# On-disk cache of decoded programs (options --cachedir and --cachesize) #
+# in the spirit of Python's __pycache__.                                 #
+#                                                                        #
+# Entries are named by a SHA-256 hash:                                   #
+#                                                                        #
+#   <hash>.mepab  program text and instruction set (pt or en) -> the     #
+#                 program after inputProgram and fixArgs, in the format  #
+#                 of mepa_obj.py                                         #
+#   <hash>.aot    program, memory size, translator (mepa_aot.py) and     #
+#                 Python version -> result of mepa_aot.compileProgram,   #
+#                 through marshal                                        #
+#                                                                        #
+# A hit sets the modification time of its entry; after each new entry    #
+# the least recently used ones are removed until the directory holds at  #
+# most --cachesize bytes.  Entries are written under a temporary name    #
+# and then renamed.  The cache is only an accelerator: entries which     #
+# cannot be read or written are ignored.                                 #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, io, hashlib, marshal, struct
+
+import mepa_defs
+from mepa_defs import *
+import mepa_obj
+import mepa_aot
+
+VERSION = 1
+
+PROGRAM_EXT = mepa_obj.OBJECT_EXT
+AOT_EXT = ".aot"
+
+def digest(*parts):
+    h = hashlib.sha256(b"MEPC %d" % VERSION)
+    for part in parts:
+        h.update(b"\0")
+        h.update(part if isinstance(part,bytes) else str(part).encode("utf-8"))
+    return h.hexdigest()
+
+def instructionSet():
+    return repr(sorted(INSTR_DICT.items()))
+
+def lookup(cachedir,name):
+    """ Contents of entry 'name', or None. """
+    path = os.path.join(cachedir,name)
+    try:
+        with open(path,"rb") as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+def discard(cachedir,name):
+    try:
+        os.remove(os.path.join(cachedir,name))
+    except OSError:
+        pass
+
+def store(cachedir,name,data,size):
+    """ Writes entry 'name' and evicts entries beyond 'size' bytes. """
+    path = os.path.join(cachedir,name)
+    tmp = "%s.%d.tmp" % (path,os.getpid())
+    try:
+        os.makedirs(cachedir,exist_ok=True)
+        with open(tmp,"wb") as f:
+            f.write(data)
+        os.replace(tmp,path)
+    except OSError:
+        discard(cachedir,os.path.basename(tmp))
+        return
+    evict(cachedir,size)
+
+def evict(cachedir,size):
+    """ Removes least recently used entries until at most 'size' bytes
+        are left.
+    """
+    entries = []
+    try:
+        with os.scandir(cachedir) as it:
+            for e in it:
+                if e.name.endswith((PROGRAM_EXT,AOT_EXT)):
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns,st.st_size,e.name))
+    except OSError:
+        return
+    total = sum(e[1] for e in entries)
+    for _, n, name in sorted(entries):
+        if total<=size:
+            break
+        discard(cachedir,name)
+        total -= n
+
+def loadProgram(f,cachedir,size):
+    """ Reads text program file f; returns P and L as inputProgram and
+        fixArgs would, from the cache when possible.
+    """
+    try:
+        text = f.read()
+    except:
+        Msg(UNEXPECTED_PROGRAM_READING_EXCEPTION,quit=True,code=1)
+    name = digest(instructionSet(),text)+PROGRAM_EXT
+    data = lookup(cachedir,name)
+    if data is not None:
+        try:
+            return mepa_obj.decodeObject(data)
+        except SystemExit:
+            raise
+        except Exception:
+            discard(cachedir,name)
+    mepa_defs.PROG_FILE = io.StringIO(text)
+    P, L = inputProgram()
+    fixArgs(P,L)
+    buf = io.BytesIO()
+    try:
+        mepa_obj.saveObject(P,L,buf)
+    except struct.error:
+        return P, L             # arguments beyond 64 bits
+    store(cachedir,name,buf.getvalue(),size)
+    return P, L
+
+def translator():
+    try:
+        st = os.stat(mepa_aot.__file__)
+    except OSError:
+        return None
+    return "%d %d" % (st.st_mtime_ns,st.st_size)
+
+def compileProgram(P,cells,cachedir,size):
+    """ mepa_aot.compileProgram(P,cells) through the cache. """
+    source = translator()
+    if source is None:
+        return mepa_aot.compileProgram(P,cells)
+    program = "\n".join("%s %s" % (INSTR_DICT[p[1].upper()],
+                                   " ".join(str(a) for a in p[2]))
+                        for p in P)
+    name = digest(sys.implementation.cache_tag,source,cells,program)+AOT_EXT
+    data = lookup(cachedir,name)
+    if data is not None:
+        try:
+            return marshal.loads(data)
+        except (ValueError,EOFError,TypeError):
+            discard(cachedir,name)
+    compiled = mepa_aot.compileProgram(P,cells)
+    store(cachedir,name,marshal.dumps(compiled),size)
+    return compiled
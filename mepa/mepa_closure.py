@@ -0,0 +1,495 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Closure-threaded execution: at load time every instruction becomes a   #
+# Python closure with its operands, jump targets and type checks already #
+# bound.  Each closure receives the machine state and returns the        #
+# address of the next instruction, so that the main loop is simply       #
+#                                                                        #
+#     pc = code[pc](st)                                                  #
+#                                                                        #
+# Memory has the same layout as in mepa_interp.py.  Debugging            #
+# instructions (DBUG, STEP, DUMP) are not supported: such programs, as   #
+# well as --debug and --step runs, use the table engine instead.         #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+from mepa_defs import *
+
+# Instructions handled only by mepa_interp.py
+UNSUPPORTED = [ "dbug", "step", "dump" ]
+
+class State:
+    """ Machine registers and I/O shared by all closures. """
+    __slots__ = ("s", "token", "write", "msg", "room")
+
+    def __init__(self,vm):
+        self.s = -1
+        self.token = vm.readToken
+        self.write = vm.write
+        self.msg = vm.Msg
+        self.room = vm.room
+
+def supported(P):
+    """ Checks whether program can run on this engine. """
+    return not any(INSTR_DICT[p[1].upper()] in UNSUPPORTED for p in P)
+
+#======================================================================
+# Closure factories: make_<name>(pc,args,V,T,D,check) -> closure
+#======================================================================
+
+def make_binop(op):
+    fn = BINARY_FUNCTIONS[op]
+    def factory(pc,args,V,T,D,check):
+        nxt = pc+1
+        if check:
+            def binop(st):
+                s = st.s
+                assert (T[s-1]==0 or undefined(T[s-1])) and \
+                       (T[s]==0 or undefined(T[s]))
+                v = fn(V[s-1],V[s])
+                s -= 1;  st.s = s
+                V[s] = v;  T[s] = 0
+                return nxt
+        else:
+            def binop(st):
+                s = st.s
+                v = fn(V[s-1],V[s])
+                s -= 1;  st.s = s
+                V[s] = v;  T[s] = 0
+                return nxt
+        return binop
+    return factory
+
+def make_inv(pc,args,V,T,D,check):
+    nxt = pc+1
+    def inv(st):
+        s = st.s
+        if check:
+            assert T[s]==0 or undefined(T[s])
+        V[s] = -V[s];  T[s] = 0
+        return nxt
+    return inv
+
+def make_nott(pc,args,V,T,D,check):
+    nxt = pc+1
+    def nott(st):
+        s = st.s
+        if check:
+            assert T[s]==0 or undefined(T[s])
+        V[s] = 1-V[s];  T[s] = 0
+        return nxt
+    return nott
+
+def make_nop(pc,args,V,T,D,check):
+    nxt = pc+1
+    def nop(st):
+        return nxt
+    return nop
+
+def make_halt(pc,args,V,T,D,check):
+    def halt(st):
+        return -1
+    return halt
+
+def make_read(pc,args,V,T,D,check):
+    nxt = pc+1
+    def read(st):
+        if st.s+1>=len(V):
+            st.room(st.s+1)
+        token = st.token()
+        try:
+            v = int(token)
+            s = st.s+1
+            V[s] = v;  T[s] = 0
+            st.s = s
+        except:
+            st.msg(ILLEGAL_INPUT_VALUE,quit=True,code=1)
+        return nxt
+    return read
+
+def make_writ(pc,args,V,T,D,check):
+    nxt = pc+1
+    def writ(st):
+        s = st.s
+        if check:
+            assert T[s]==0 or undefined(T[s])
+        st.write("%d\n" % V[s])
+        st.s = s-1
+        return nxt
+    return writ
+
+def make_init(pc,args,V,T,D,check):
+    nxt = pc+1
+    def init(st):
+        st.s = -1;  D[0] = 0
+        return nxt
+    return init
+
+def make_cont(pc,args,V,T,D,check):
+    nxt = pc+1
+    def cont(st):
+        s = st.s
+        if check:
+            assert T[s]==2 or undefined(T[s])
+        a = V[s]
+        V[s] = V[a];  T[s] = T[a]
+        return nxt
+    return cont
+
+def make_ldct(pc,args,V,T,D,check):
+    nxt = pc+1
+    k = args[0]
+    def ldct(st):
+        s = st.s+1
+        if s>=len(V):
+            st.room(s)
+        V[s] = k;  T[s] = 0
+        st.s = s
+        return nxt
+    return ldct
+
+def make_jmp(pc,args,V,T,D,check):
+    p = args[0]
+    def jmp(st):
+        return p
+    return jmp
+
+def make_jmpf(pc,args,V,T,D,check):
+    nxt = pc+1
+    p = args[0]
+    def jmpf(st):
+        s = st.s
+        if check:
+            assert T[s]==0 or undefined(T[s])
+        st.s = s-1
+        v = V[s]
+        if not v:
+            if v is None:
+                raise TypeError
+            return p
+        return nxt
+    return jmpf
+
+def make_alloc(pc,args,V,T,D,check):
+    nxt = pc+1
+    n = args[0]
+    def alloc(st):
+        st.s += n
+        if st.s>=len(V):
+            st.room(st.s)
+        return nxt
+    return alloc
+
+def make_dealloc(pc,args,V,T,D,check):
+    nxt = pc+1
+    n = args[0]
+    def dealloc(st):
+        st.s -= n
+        return nxt
+    return dealloc
+
+def make_entproc(pc,args,V,T,D,check):
+    nxt = pc+1
+    k = args[0]
+    def entproc(st):
+        assert len(D)>k
+        s = st.s+1
+        if s>=len(V):
+            st.room(s)
+        V[s] = D[k-1];  T[s] = 2
+        D[k] = s+1
+        st.s = s
+        return nxt
+    return entproc
+
+def make_retproc(pc,args,V,T,D,check):
+    n = args[0]
+    def retproc(st):
+        s = st.s
+        if check:
+            assert (T[s-1]==1 or undefined(T[s-1])) and \
+                   (T[s-2]==2 or undefined(T[s-2])) and \
+                   (T[s-3]==3 or undefined(T[s-3]))
+        t = V[s-1]
+        D[t] = V[s-2]
+        i = V[s-3]
+        st.s = s-(n+4)
+        while t>1:
+            if check:
+                assert T[D[t]-1]==2 or undefined(T[D[t]-1])
+            D[t-1] = V[D[t]-1]
+            t -= 1
+        return i
+    return retproc
+
+def make_indx(pc,args,V,T,D,check):
+    nxt = pc+1
+    k = args[0]
+    def indx(st):
+        s = st.s
+        if check:
+            assert (T[s-1]==2 or undefined(T[s-1])) and \
+                   (T[s]==0 or undefined(T[s]))
+        V[s-1] = V[s-1]+V[s]*k;  T[s-1] = 2
+        st.s = s-1
+        return nxt
+    return indx
+
+def make_ldmv(pc,args,V,T,D,check):
+    nxt = pc+1
+    k = args[0]
+    def ldmv(st):
+        s = st.s
+        if check:
+            assert T[s]==2 or undefined(T[s])
+        if s+k>=len(V):
+            st.room(s+k)
+        t = V[s]
+        V[s:s+k] = V[t:t+k];  T[s:s+k] = T[t:t+k]
+        st.s = s+(k-1)
+        return nxt
+    return ldmv
+
+def make_stmv(pc,args,V,T,D,check):
+    nxt = pc+1
+    k = args[0]
+    def stmv(st):
+        s = st.s
+        if check:
+            assert T[s-k]==2 or undefined(T[s-k])
+        t = V[s-k]
+        V[t:t+k] = V[s-k+1:s+1];  T[t:t+k] = T[s-k+1:s+1]
+        st.s = s-(k+1)
+        return nxt
+    return stmv
+
+def make_ldvl(pc,args,V,T,D,check):
+    nxt = pc+1
+    m, n = args
+    def ldvl(st):
+        d = D[m]
+        assert d!=None
+        s = st.s+1
+        if s>=len(V):
+            st.room(s)
+        V[s] = V[d+n];  T[s] = T[d+n]
+        st.s = s
+        return nxt
+    return ldvl
+
+def make_ldaddr(pc,args,V,T,D,check):
+    nxt = pc+1
+    m, n = args
+    def ldaddr(st):
+        d = D[m]
+        assert d!=None
+        s = st.s+1
+        if s>=len(V):
+            st.room(s)
+        V[s] = d+n;  T[s] = 2
+        st.s = s
+        return nxt
+    return ldaddr
+
+def make_stvl(pc,args,V,T,D,check):
+    nxt = pc+1
+    m, n = args
+    def stvl(st):
+        d = D[m]
+        assert d!=None
+        s = st.s
+        V[d+n] = V[s];  T[d+n] = T[s]
+        st.s = s-1
+        return nxt
+    return stvl
+
+def make_ldvi(pc,args,V,T,D,check):
+    nxt = pc+1
+    m, n = args
+    def ldvi(st):
+        d = D[m]
+        assert d!=None
+        if check:
+            assert T[d+n]==2 or undefined(T[d+n])
+        a = V[d+n]
+        s = st.s+1
+        if s>=len(V):
+            st.room(s)
+        V[s] = V[a];  T[s] = T[a]
+        st.s = s
+        return nxt
+    return ldvi
+
+def make_stvi(pc,args,V,T,D,check):
+    nxt = pc+1
+    m, n = args
+    def stvi(st):
+        d = D[m]
+        assert d!=None
+        if check:
+            assert T[d+n]==2 or undefined(T[d+n])
+        a = V[d+n]
+        s = st.s
+        V[a] = V[s];  T[a] = T[s]
+        st.s = s-1
+        return nxt
+    return stvi
+
+def make_entlabl(pc,args,V,T,D,check):
+    nxt = pc+1
+    j, n = args
+    def entlabl(st):
+        st.s = D[j]+n-1
+        if st.s>=len(V):
+            st.room(st.s)
+        return nxt
+    return entlabl
+
+def make_ldgaddr(pc,args,V,T,D,check):
+    nxt = pc+1
+    p, k = args
+    def ldgaddr(st):
+        s = st.s
+        if s+3>=len(V):
+            st.room(s+3)
+        V[s+1] = p;  T[s+1] = 3
+        V[s+2] = D[k];  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        st.s = s+3
+        return nxt
+    return ldgaddr
+
+def make_call(pc,args,V,T,D,check):
+    p, k = args
+    ret = pc+1
+    def call(st):
+        s = st.s
+        if s+3>=len(V):
+            st.room(s+3)
+        V[s+1] = ret;  T[s+1] = 3
+        V[s+2] = D[k];  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        st.s = s+3
+        return p
+    return call
+
+def make_callpar(pc,args,V,T,D,check):
+    m, n, k = args
+    ret = pc+1
+    def callpar(st):
+        assert D[m]!=None
+        addr = D[m]+n
+        s = st.s
+        if s+3>=len(V):
+            st.room(s+3)
+        if check:
+            assert (T[addr]==3 or undefined(T[addr])) and \
+                   (T[addr+1]==2 or undefined(T[addr+1])) and \
+                   (T[addr+2]==1 or undefined(T[addr+2]))
+        V[s+1] = ret;  T[s+1] = 3
+        V[s+2] = D[k];  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        st.s = s+3
+        i = V[addr]
+        t = V[addr+2]
+        D[t] = V[addr+1]
+        while t>1:
+            if check:
+                assert T[D[t]-1]==2 or undefined(T[D[t]-1])
+            D[t-1] = V[D[t]-1]
+            t -= 1
+        return i
+    return callpar
+
+FACTORIES = dict((op,make_binop(op)) for op in BINARY_FUNCTIONS)
+FACTORIES.update({
+          "inv":     make_inv,
+          "nott":    make_nott,
+          "nop":     make_nop,
+          "halt":    make_halt,
+          "read":    make_read,
+          "writ":    make_writ,
+          "init":    make_init,
+          "cont":    make_cont,
+          "ldct":    make_ldct,
+          "jmp":     make_jmp,
+          "jmpf":    make_jmpf,
+          "alloc":   make_alloc,
+          "dealloc": make_dealloc,
+          "entproc": make_entproc,
+          "retproc": make_retproc,
+          "indx":    make_indx,
+          "ldmv":    make_ldmv,
+          "stmv":    make_stmv,
+          "ldvl":    make_ldvl,
+          "ldaddr":  make_ldaddr,
+          "stvl":    make_stvl,
+          "ldvi":    make_ldvi,
+          "stvi":    make_stvi,
+          "entlabl": make_entlabl,
+          "ldgaddr": make_ldgaddr,
+          "call":    make_call,
+          "callpar": make_callpar,
+          })
+
+def build(P,V,T,D,check):
+    """ Turns program into a list of closures. """
+    code = []
+    for pc in range(len(P)):
+        p = P[pc]
+        name = INSTR_DICT[p[1].upper()]
+        args = tuple(p[2])
+        code.append(FACTORIES[name](pc,args,V,T,D,check))
+    return code
+
+#======================================================================
+# Execution
+#======================================================================
+
+def execute(vm):
+    """ Main execution function for closure-threaded code; machine
+        options, streams and results belong to MepaVM object 'vm'.
+    """
+    opts = vm.options
+    Msg = vm.Msg
+
+    D = opts["displaysize"] * [None]
+    vm.allocate()
+    V = vm.V
+    T = vm.T
+    check = not opts["nocheck"]
+    limit = opts["limit"]
+    code = build(vm.P,V,T,D,check)
+    st = State(vm)
+    vm.executed = 0
+
+    pc = 0
+    count = 0
+    try:
+        stop = vm.checkpoint(count,limit)
+        while pc>=0:
+            for count in range(count+1,stop+1):
+                pc = code[pc](st)
+                if pc<0:     # halt
+                    break
+            else:
+                stop = vm.checkpoint(count,limit)
+    except AssertionError as e:
+        Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+        sys.exit(1)
+    except SystemExit as e:
+        sys.exit(1)
+    except IndexError:
+        if pc>=len(code):
+            Msg(PROG_END,quit=True,code=1)
+        Msg(ILLEGAL_VALUE % pc, quit=True)
+    except:
+        Msg(ILLEGAL_VALUE % pc, quit=True)
+    vm.executed = count
+    Msg(EXECUTED_INSTRUCTIONS % count)
+    return -1
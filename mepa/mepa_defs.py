@@ -14,9 +14,13 @@
 #------------------------------------------------------------------------#
 
 
-import sys, traceback, getopt
+import sys, os, traceback, getopt, operator, struct
+from array import array
 
-if sys.argv[0].endswith("mepa_pt.py"):
+# Language is detected by program name; tools other than mepa.py and
+# mepa_pt.py may select it through the MEPA_LANG environment variable.
+if os.environ.get("MEPA_LANG",
+                  "pt" if sys.argv[0].endswith("mepa_pt.py") else "en")=="pt":
     from mepa_instr_pt import *
     from mepa_strings_pt import *
 else: ## default en
@@ -31,15 +35,37 @@ Usage:
          [--messfile <file name> (stderr)]
          [--programsize <integer> (500)]
          [--stacksize <integer> (500)]
+         [--memlimit <integer> (67108864)]
          [--displaysize <integer> (10)]
          [--limit <integer> (10000)]
+         [--timeout <milliseconds> (none)]
+         [--cputime <milliseconds> (none)]
+         [--checkpoint-every <integer> (none)]
+         [--snapfile <file name> (mepa.snap)]
+         [--resume <file name> (none)]
+         [--cachedir <directory> (none)]
+         [--cachesize <integer> (16777216)]
+         [--sample-every <integer> (none)]
+         [--sample-timer <milliseconds> (none)]
+         [--samplefile <file name> (mepa.folded)]
+         [--trace <file name> (none)]
          [--infile <file name> (stdin)]
          [--outfile <file name> (stdout)]
          [--progfile <file name> (stdin)]
+         [--proffile <file name> (none)]
          [--debug (False)]
          [--nocheck (False)]
          [--silent (False)]
          [--step (False)]
+         [--fuse (False)]
+         [--verify (False)]
+         [--noverify (False)]
+         [--interactive (False)]
+         [--profile (False)]
+         [--memstats (False)]
+         [--jit (False)]
+         [--engine eval|table|closure|aot|reg (eval)]
+         [--intwidth 32|64 (none)]
 """
 
 
@@ -49,32 +75,156 @@ OPTIONS_DICT = {
                  "messfile":    sys.stderr,
                  "programsize": 500,
                  "stacksize":   500,
+                 "memlimit":    64*1024*1024,
                  "displaysize": 10,
                  "limit":       10000,
+                 "timeout":     None,
+                 "cputime":     None,
+                 "checkpoint-every": None,
+                 "snapfile":    "mepa.snap",
+                 "resume":      None,
+                 "cachedir":    None,
+                 "cachesize":   16*1024*1024,
+                 "sample-every": None,
+                 "sample-timer": None,
+                 "samplefile":  "mepa.folded",
+                 "trace":       None,
                  "infile":      sys.stdin,
                  "outfile":     sys.stdout,
                  "progfile":    sys.stdin,
+                 "proffile":    None,
                  "debug":       False,
                  "nocheck":     False,
                  "silent":      False,
                  "step":        False,
+                 "fuse":        False,
+                 "verify":      False,
+                 "noverify":    False,
+                 "interactive": False,
+                 "profile":     False,
+                 "memstats":    False,
+                 "jit":         False,
+                 "engine":      "eval",
+                 "intwidth":    None,
                }
                
-BOOL_OPTIONS = [ "help", "copyright", "debug", "nocheck", "silent", "step"]
-INT_OPTIONS =  [ "programsize", "stacksize", "displaysize", "limit"]
-FILE_OPTIONS = [ "messfile", "infile", "outfile", "progfile"]
+BOOL_OPTIONS = [ "help", "copyright", "debug", "nocheck", "silent", "step",
+                 "fuse", "verify", "noverify", "interactive", "profile",
+                 "jit", "memstats"]
+INT_OPTIONS =  [ "programsize", "stacksize", "displaysize", "limit",
+                 "memlimit", "timeout", "cputime", "checkpoint-every",
+                 "cachesize", "sample-every", "sample-timer"]
+FILE_OPTIONS = [ "messfile", "infile", "outfile", "progfile", "proffile"]
+# file names kept, not opened
+PATH_OPTIONS = [ "snapfile", "resume", "cachedir", "samplefile", "trace"]
+CHOICE_OPTIONS = { "engine": ["eval", "table", "closure", "aot", "reg"],
+                   "intwidth": ["32", "64"] }
 
 def appendColumn(s): 
     """ Help to process options requiring args. """
     return s+"="
     
-OPTIONS = BOOL_OPTIONS + list(map(appendColumn,INT_OPTIONS+FILE_OPTIONS))
-OPTIONS_ORDER = FILE_OPTIONS + INT_OPTIONS + BOOL_OPTIONS
+OPTIONS = BOOL_OPTIONS + list(map(appendColumn,INT_OPTIONS+FILE_OPTIONS+
+                                        PATH_OPTIONS+list(CHOICE_OPTIONS)))
+OPTIONS_ORDER = FILE_OPTIONS + PATH_OPTIONS + INT_OPTIONS + BOOL_OPTIONS + \
+                list(CHOICE_OPTIONS)
+
+def strict(fn):
+    """ Operation 'fn' failing on undefined operands, which hold None
+        (option --nocheck), as the other operations do by themselves.
+    """
+    def op(v1,v2):
+        if v1 is None or v2 is None:
+            raise TypeError
+        return fn(v1,v2)
+    return op
+
+# Functions computing values of binary operations
+BINARY_FUNCTIONS = {
+          "add":  operator.add,
+          "subt": operator.sub,
+          "mult": operator.mul,
+          "divi": operator.floordiv,
+          "andd": strict(lambda v1,v2: v1 and v2),
+          "orr":  strict(lambda v1,v2: v1 or v2),
+          "less": operator.lt,
+          "grt":  operator.gt,
+          "eql":  strict(operator.eq),
+          "dif":  strict(operator.ne),
+          "leq":  operator.le,
+          "geq":  operator.ge,
+         }
+
+# Memory arrays for fixed width integers (option --intwidth)
+INT_TYPECODES = { "32": "i", "64": "q" }
+
+def wrapper(width):
+    """ Two's complement wraparound to 'width' bits. """
+    half = 1 << (width-1)
+    mask = (1 << width)-1
+    def wrap(v):
+        return ((v+half) & mask)-half
+    return wrap
+
+def fixedFunctions(width):
+    """ BINARY_FUNCTIONS for integers of 'width' bits: arithmetic wraps
+        around, and division truncates toward zero, as in Pascal.
+    """
+    half = 1 << (width-1)
+    mask = (1 << width)-1
+    def divi(v1,v2):
+        q = abs(v1)//abs(v2)
+        if (v1<0)!=(v2<0):
+            q = -q
+        return ((q+half) & mask)-half
+    functions = dict(BINARY_FUNCTIONS)
+    functions.update({
+          "add":  lambda v1,v2: ((v1+v2+half) & mask)-half,
+          "subt": lambda v1,v2: ((v1-v2+half) & mask)-half,
+          "mult": lambda v1,v2: ((v1*v2+half) & mask)-half,
+          "divi": divi,
+         })
+    return functions
+
+# Statuses of MepaVM.run when a budget runs out (see MepaVM.checkpoint)
+BUDGETS = ("limit", "timeout", "cputime")
+
+# Instructions between tests of the clocks of options --timeout and
+# --cputime
+CLOCK_INTERVAL = 10000
+
+# Memory starts with 2*stacksize cells and grows by this many cells
+# whenever the stack passes its end, up to option --memlimit (bytes)
+STACK_CHUNK = 4096
+
+def cellBytes(width):
+    """ Bytes taken by a memory cell: its value (list slot, or typed
+        array item with --intwidth) and its type.
+    """
+    if width is None:
+        return struct.calcsize("P")+1
+    return array(INT_TYPECODES[width]).itemsize+1
+
+def maxCells(options):
+    """ Memory cells allowed by option --memlimit. """
+    return options["memlimit"]//cellBytes(options["intwidth"])
+
+# Type of memory cells never written
+UNDEF = 255
+
+def undefined(t):
+    """ Used in type checks: a cell never written fails as an illegal
+        value, not as an illegal type.
+    """
+    if t==UNDEF:
+        raise TypeError
+    return False
 
 MESS_FILE = sys.stderr
 IN_FILE = sys.stdin
 OUT_FILE = sys.stdout
 PROG_FILE = sys.stdin
+PROF_FILE = None
 
 def Msg(msg,quit=False,code=0,silent=False,eol=True):
     """ Error and other messages. """
@@ -229,9 +379,9 @@ def fixArgs(P,L):
             a = args[k]
             if (a[0] in ('+','-') and a[1:].isdigit()) or\
                (a.isdigit()):
-                pass
+                args[k] = int(a)
             elif a in L:
-                args[k] = str(L[a])
+                args[k] = L[a]
             else:
                 Msg(ILLEGAL_ARGUMENT % count,quit=True,code=1)
             count += 1
@@ -242,7 +392,7 @@ def makeMepa(P):
     MP = []
     for p in P:
         name = INSTR_DICT[p[1].upper()]
-        args = ",".join(p[2])
+        args = ",".join(str(a) for a in p[2])
         m = "%s(%s)" % (name,args)
         MP.append(m)
     return MP
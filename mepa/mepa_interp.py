@@ -10,452 +10,1610 @@
 #                                                                        #
 # Interpreting functions                                                 #
 #                                                                        #
+# All the state of a machine -- registers, memory, display, options and  #
+# I/O streams -- is kept in a MepaVM object, so that several programs    #
+# may run side by side in one process.                                   #
+#                                                                        #
 #------------------------------------------------------------------------#
 
-import traceback
+import sys, time, signal, traceback
+from array import array
 
+import mepa_defs
 from mepa_defs import *
+import mepa_closure
+import mepa_aot
+import mepa_reg
+import mepa_verify
+import mepa_prof
+import mepa_trace
+import mepa_snap
+import mepa_cache
+import mepa_sample
+import mepa_tracefile
 
 # Jump instructions
 JMP_INSTR = [ "jmp", "retproc", "call", "callpar" ]
 
-def execute(MP,P,L,msfile,infile,outfile):
-    """Main execution function. """
-    global s, i, D, M, labels, debug, nocheck, inf, outf, inputline, check, stepexec
-    
-    inf = infile
-    outf = outfile
-    labels = L
-    inputline = []
-    
-    # initial register values and memory sizes
-    i = 0
-    s = -1
-    D = OPTIONS_DICT["displaysize"] * [None]
-    
-    # memory is [v,t] where v: value, t: type (0: int, 1: level, 
-    # 2: mem addr, 3: prog address)
-    M = OPTIONS_DICT["stacksize"] * [None,None]
-    
-    debug = OPTIONS_DICT["debug"]
-    nocheck = OPTIONS_DICT["nocheck"]
-    check = not nocheck
-    limit = OPTIONS_DICT["limit"]
-    stepexec = OPTIONS_DICT["step"]
-    count = 0
-    
-    # execution loop
-    while True:
-        li = i
+# Instructions which may not continue at the next address
+TRANSFER_INSTR = JMP_INSTR + [ "jmpf", "halt",
+                               "ldvl_ldvl_op_jmpf", "ldvl_ldct_op_jmpf" ]
+
+# Largest number of instructions of a table entry (see FUSIONS)
+MAX_WEIGHT = 4
+
+# Display entries never set, as kept in typed arrays
+NO_LINK = -1
+
+# Output values kept before writing to the output file
+OUTPUT_BUFFER = 4096
+
+# Instruction sequences and their superinstructions; "op" stands for
+# any binary operation
+FUSIONS = [
+          (("ldvl","ldvl","op","stvl"), "ldvl_ldvl_op_stvl"),
+          (("ldvl","ldct","op","stvl"), "ldvl_ldct_op_stvl"),
+          (("ldvl","ldvl","op","jmpf"), "ldvl_ldvl_op_jmpf"),
+          (("ldvl","ldct","op","jmpf"), "ldvl_ldct_op_jmpf"),
+          (("ldvl","stvl"), "ldvl_stvl"),
+          (("ldct","stvl"), "ldct_stvl"),
+          (("ldct","op"), "ldct_op"),
+          ]
+
+# Handlers without debugging output, used by the fast loop
+FAST_HANDLERS = {
+          "ldvl": "fast_ldvl",
+          "stvl": "fast_stvl",
+          "ldct": "fast_ldct",
+          "jmpf": "fast_jmpf",
+          }
+
+class Deopt(Exception):
+    """ Superinstruction cannot run: back to plain instruction. """
+    pass
+
+class Leave(Exception):
+    """ Halt, or limit close: leaves the fast loop. """
+    pass
+
+def fuseArgs(name,args,functions):
+    """ Superinstruction arguments contributed by one instruction. """
+    if name in functions:
+        return (functions[name],)
+    return args
+
+class MepaVM:
+    """ MEPA machine running program P (with labels L).  'options' are
+        added to a copy of OPTIONS_DICT; streams default to those of
+        mepa_defs.
+    """
+
+    def __init__(self,P,L,options=None,infile=None,outfile=None,messfile=None,
+                 proffile=None):
+        self.P = P
+        self.labels = L
+        self.options = dict(OPTIONS_DICT)
+        if options:
+            self.options.update(options)
+        self.inf = infile if infile is not None else mepa_defs.IN_FILE
+        self.outf = outfile if outfile is not None else mepa_defs.OUT_FILE
+        self.messfile = messfile if messfile is not None else mepa_defs.MESS_FILE
+        self.proffile = proffile if proffile is not None else mepa_defs.PROF_FILE
+        self.executed = 0
+        self.saved = 0
+        self.prepared = False
+        self.out = []
+        self.prof = None
+        self.sampler = None
+        self.recorder = None
+        self.sampleevery = self.options["sample-every"]
+        self.clocks = []
+        self.status = None
+        self.snapevery = self.options["checkpoint-every"]
+        self.consumed = 0
+        self.written = 0
+        width = self.options["intwidth"]
+        if width is None:
+            self.functions = BINARY_FUNCTIONS
+            self.wrap = None
+        else:
+            self.functions = fixedFunctions(int(width))
+            self.wrap = wrapper(int(width))
+
+    #==================================================================
+    # Messages
+    #==================================================================
+
+    def Msg(self,msg,quit=False,code=0,silent=False,eol=True):
+        """ Error and other messages; pending output goes first. """
+        if not silent:
+            if self.out:
+                self.flushOutput()
+            if eol:
+                self.messfile.write(msg+'\n')
+            else:
+                self.messfile.write(msg)
+        if quit:
+            self.flush()
+            sys.exit(code)
+
+    def UndMsg(self,s,c,k=1):
+        self.Msg(s)
+        self.Msg((len(s)-k)*c)
+
+    def impossible(self,k):
+        self.Msg(INTERNAL_ERROR % k,quit=True,code=1)
+
+    #==================================================================
+    # Execution
+    #==================================================================
+
+    def chooseEngine(self):
+        """ Requested engine, or the nearest one able to run program. """
+        opts = self.options
+        engine = opts["engine"]
+        if (opts["fuse"] or opts["jit"]) and engine=="eval":
+            engine = "table"
+        if self.profiling() or opts["trace"] is not None:
+            return "table"
+        if opts["memstats"] and engine=="aot":
+            engine = "table"         # cells of translated code are locals
+        if (opts["checkpoint-every"] or opts["resume"]) and \
+           engine in ("closure","aot","reg"):
+            engine = "table"         # state of snapshots kept in the machine
+        if self.sampling() and engine in ("closure","aot","reg"):
+            engine = "table"         # current address kept in the machine
+        if opts["debug"] or opts["step"] or opts["intwidth"] is not None:
+            if engine in ("closure","aot","reg"):
+                engine = "table"
+        if engine=="aot":
+            if opts["cachedir"] is not None:
+                self.compiled = mepa_cache.compileProgram(
+                    self.P,maxCells(opts),opts["cachedir"],opts["cachesize"])
+            else:
+                self.compiled = mepa_aot.compileProgram(self.P,maxCells(opts))
+            if self.compiled is None:
+                engine = "table"
+        elif engine=="reg":
+            self.compiled = mepa_reg.convert(self.P,maxCells(opts))
+            if self.compiled is None:
+                engine = "table"
+        elif engine=="closure" and not mepa_closure.supported(self.P):
+            engine = "table"
+        return engine
+
+    def prepare(self):
+        """ Verifies program, chooses engine and decodes (or translates)
+            program once for every following run.
+        """
+        opts = self.options
+        if opts["verify"] or not (opts["nocheck"] or opts["noverify"]):
+            bad = mepa_verify.verify(self.P,maxCells(opts))
+            if bad is None:
+                opts["nocheck"] = True   # checks cannot fail
+            elif opts["verify"]:
+                if bad[1] in mepa_verify.MALFORMED:
+                    self.Msg(VERIFY_REJECTED % bad,quit=True,code=1)
+                self.Msg(VERIFY_NOT_COVERED % bad)
+                opts["nocheck"] = False  # the checks are the guarantee
+        engine = opts["engine"] = self.chooseEngine()
+        if opts["intwidth"] is not None:
+            opts["jit"] = False      # traces keep unbounded integers
+        if self.sampling():
+            opts["jit"] = False      # traces do not keep the address
+        if self.profiling() or opts["jit"] or engine=="reg" or \
+           opts["trace"] is not None:
+            opts["fuse"] = False     # plain instructions are counted, traced
+                                     # or converted
+        if engine in ("aot","reg"):
+            self.code = self.compiled
+        elif engine=="closure":
+            self.code = None       # closures are built for each run
+        elif engine=="table":
+            self.code = self.decode()
+            if opts["fuse"]:
+                self.code = self.fuse(self.code)
+        else:
+            self.code = makeMepa(self.P)
+        self.prepared = True
+
+    def run(self):
+        """ Runs program from a fresh machine state; returns -1 after a
+            halt instruction, or the status ("limit", "timeout" or
+            "cputime") of a budget which ran out.  Both are left in
+            'status'.  Errors are reported on the message stream and
+            raise SystemExit, as in the command line.
+        """
+        if not self.prepared:
+            self.prepare()
+        self.startIO()
+        self.startClocks()
+        if self.profiling():
+            self.prof = mepa_prof.Profile(self.P,self.labels)
+        if self.sampling():
+            self.sampler = mepa_sample.Sampler(self.P,self.labels)
+            self.startTimer()
+        if self.options["trace"] is not None:
+            self.startTrace()
+        engine = self.options["engine"]
+        self.status = "error"
         try:
+            if engine=="aot":
+                res = mepa_aot.execute(self,self.code)
+            elif engine=="closure":
+                res = mepa_closure.execute(self)
+            else:
+                res = self.execute(self.code)
+            self.status = "halt"
+            if self.options["memstats"]:
+                self.memoryReport()
+            return res
+        except SystemExit:
+            if self.status not in BUDGETS:
+                raise
+            return self.status
+        finally:
+            if self.prof is not None:
+                self.profileReport()
+            if self.sampler is not None:
+                self.stopTimer()
+                self.sampleReport()
+            if self.recorder is not None:
+                self.stopTrace()
+            self.flush()
+
+    #==================================================================
+    # Budgets
+    #
+    # Besides the instruction limit (option --limit), a run may have a
+    # wall clock and a CPU time budget (options --timeout and --cputime,
+    # in milliseconds).  Engines keep the instruction count of the next
+    # 'checkpoint', which tests every budget: the limit itself, or every
+    # CLOCK_INTERVAL instructions when there are clocks.  The fast, trace,
+    # register and translated code only test it at block boundaries and
+    # backward jumps, as they test the limit.  Checkpoints also save the
+    # snapshots of option --checkpoint-every (see below).
+    #==================================================================
+
+    def startClocks(self):
+        opts = self.options
+        self.clocks = []
+        if opts["timeout"] is not None:
+            self.clocks.append((time.monotonic,
+                                time.monotonic()+opts["timeout"]/1000,
+                                "timeout"))
+        if opts["cputime"] is not None:
+            self.clocks.append((time.process_time,
+                                time.process_time()+opts["cputime"]/1000,
+                                "cputime"))
+
+    def checkpoint(self,count,limit):
+        """ Tests budgets after 'count' instructions; returns the count of
+            the next checkpoint.
+        """
+        if count>=limit:
+            self.budget("limit",count)
+        for clock, end, status in self.clocks:
+            if clock()>=end:
+                self.budget(status,count)
+        stop = limit
+        if self.clocks:
+            stop = min(count+CLOCK_INTERVAL,limit)
+        if self.snapevery is not None:
+            if count>=self.nextsnap:
+                self.snapshot(count)
+                self.nextsnap = count+self.snapevery
+            stop = min(stop,self.nextsnap)
+        if self.sampler is not None and self.sampleevery is not None:
+            if count>=self.nextsample:
+                self.sampler.sample(self)
+                self.nextsample = count+self.sampleevery
+            stop = min(stop,self.nextsample)
+        return stop
+
+    def budget(self,status,count):
+        """ Stops the machine after 'count' instructions: budget 'status'
+            ran out.  With snapshots, the state is saved first, so that
+            the run may go on with --resume and larger budgets.
+        """
+        opts = self.options
+        self.status = status
+        if self.snapevery is not None:
+            self.snapshot(count)
+        if status=="limit":
+            msg = MAXIMUM_INSTRUCTIONS_EXCEEDED % opts["limit"]
+        elif status=="timeout":
+            msg = TIMEOUT_EXCEEDED % opts["timeout"]
+        else:
+            msg = CPUTIME_EXCEEDED % opts["cputime"]
+        self.Msg(msg,quit=True,code=1)
+
+    #==================================================================
+    # Snapshots
+    #
+    # With option --checkpoint-every N, the machine state is saved into
+    # the file of option --snapfile at the first checkpoint after every
+    # N instructions, and when a budget runs out; option --resume starts
+    # a run from such a file instead of the first instruction (see
+    # mepa_snap.py).  Only the eval and table engines keep the whole
+    # state in the machine: the others give way to the table engine.
+    #==================================================================
+
+    def snapshot(self,count):
+        """ Saves machine state after 'count' instructions; pending
+            output is written first, so that the output file holds
+            exactly what the snapshot accounts for.
+        """
+        self.flush()
+        fname = self.options["snapfile"]
+        try:
+            mepa_snap.save(self,count,fname)
+        except OSError:
+            self.Msg(OPEN_FILE_ERROR % fname,quit=True,code=1)
+
+    def restore(self,fname):
+        """ Restores machine state from snapshot file 'fname'; returns
+            the number of instructions already executed.
+        """
+        try:
+            count = mepa_snap.load(self,fname)
+        except OSError:
+            self.Msg(OPEN_FILE_ERROR % fname,quit=True,code=1)
+        except (mepa_snap.SnapshotError,ValueError):
+            self.Msg(ILLEGAL_SNAPSHOT_FILE % fname,quit=True,code=1)
+        self.Msg(RESUMED_SNAPSHOT % (count,self.written))
+        return count
+
+    def profiling(self):
+        return self.options["profile"] or self.proffile is not None
+
+    def sampling(self):
+        return self.sampleevery is not None or \
+               self.options["sample-timer"] is not None
+
+    def memoryReport(self):
+        """ Stack height and memory reached in last run. """
+        self.Msg(MEMORY_STATS % (self.peakDepth(),len(self.V),
+                                 len(self.V)*self.cellbytes))
+
+    def profileReport(self):
+        """ Profile of last run: report and JSON file. """
+        self.prof.finish()
+        self.prof.report(self.Msg)
+        if self.proffile is not None:
+            self.prof.dump(self.proffile)
+            self.proffile.flush()
+
+    #==================================================================
+    # Sampling profile
+    #
+    # With option --sample-every N, the checkpoints of the machine come
+    # at least every N instructions and record the current address and
+    # call stack (see mepa_sample.py); the engines which would only
+    # reach them at control transfers give way to runTable.  With option
+    # --sample-timer, a CPU time timer interrupts the machine instead,
+    # at no cost per instruction; it needs the SIGPROF signal, only
+    # available in the main thread of Unix processes.
+    #==================================================================
+
+    def startTimer(self):
+        ms = self.options["sample-timer"]
+        self.timer = None
+        if ms is None:
+            return
+        try:
+            handler = signal.signal(signal.SIGPROF,
+                                    lambda signum, frame:
+                                        self.sampler.sample(self))
+            signal.setitimer(signal.ITIMER_PROF,ms/1000,ms/1000)
+        except (AttributeError,ValueError,OSError):
+            self.Msg(SAMPLE_TIMER_UNAVAILABLE)
+            return
+        self.timer = handler
+
+    def stopTimer(self):
+        if self.timer is not None:
+            signal.setitimer(signal.ITIMER_PROF,0)
+            signal.signal(signal.SIGPROF,self.timer)
+            self.timer = None
+
+    def sampleReport(self):
+        """ Folded stacks of last run, into the file of --samplefile. """
+        fname = self.options["samplefile"]
+        try:
+            with open(fname,"w") as f:
+                stacks = self.sampler.dump(f)
+        except OSError:
+            self.Msg(OPEN_FILE_ERROR % fname)
+            return
+        self.Msg(SAMPLES_WRITTEN % (len(self.sampler.samples),stacks,fname))
+
+    #==================================================================
+    # Execution traces
+    #
+    # With option --trace, runTable writes a fixed-size binary record
+    # for every instruction executed into the given file (see
+    # mepa_tracefile.py, which also decodes it), instead of the text
+    # lines of --debug.  Like --profile, it runs the table engine
+    # without superinstructions.
+    #==================================================================
+
+    def startTrace(self):
+        fname = self.options["trace"]
+        try:
+            f = open(fname,"wb")
+        except OSError:
+            self.Msg(OPEN_FILE_ERROR % fname,quit=True,code=1)
+        self.recorder = mepa_tracefile.Recorder(self,f)
+
+    def stopTrace(self):
+        fname = self.options["trace"]
+        try:
+            self.recorder.close()
+        except OSError:
+            self.Msg(OPEN_FILE_ERROR % fname)
+        else:
+            self.Msg(TRACE_WRITTEN % (self.recorder.count,fname))
+        self.recorder = None
+
+    #==================================================================
+    # Input and output
+    #
+    # Unless execution is interactive, the whole input is read and split
+    # at the first READ instruction, and output values are kept in a
+    # buffer written when full, before any message and at the end of
+    # execution.  Interactive execution (option --interactive, step
+    # mode or input from a terminal) reads one line at a time when
+    # needed and writes every value at once.
+    #==================================================================
+
+    def startIO(self):
+        opts = self.options
+        isatty = getattr(self.inf,"isatty",None)
+        self.interactive = opts["interactive"] or opts["step"] or \
+                           (isatty is not None and isatty())
+        self.inputline = []       # tokens still to be read, reversed
+        self.inputend = False     # whole input already read
+        self.out = []
+        self.consumed = 0         # tokens read
+        self.written = 0          # output characters written
+        if self.interactive:
+            self.write = self.directWrite
+        else:
+            self.write = self.bufferedWrite
+
+    def readToken(self):
+        """ Next input token (a string). """
+        inputline = self.inputline
+        while not inputline:
+            if self.interactive:
+                line = self.inf.readline()
+            elif not self.inputend:
+                line = self.inf.read()
+                self.inputend = True
+            else:
+                line = ""
+            if not line:
+                self.Msg("\n"+UNEXPECTED_EOF_INPUT,quit=True,code=1)
+            # as in line by line reading, the last character is dropped
+            inputline = self.inputline = line[:-1].split()
+            inputline.reverse()
+        self.consumed += 1
+        return inputline.pop()
+
+    def inputWaiting(self):
+        """ READ would wait: no token left, and none yet in an input
+            stream able to tell (with a 'ready' method, as mepa_sched.Input).
+        """
+        if self.inputline:
+            return False
+        ready = getattr(self.inf,"ready",None)
+        return ready is not None and not ready()
+
+    def directWrite(self,text):
+        self.written += len(text)
+        self.outf.write(text)
+
+    def bufferedWrite(self,text):
+        out = self.out
+        out.append(text)
+        if len(out)>=OUTPUT_BUFFER:
+            self.flushOutput()
+
+    def flushOutput(self):
+        text = "".join(self.out)
+        self.written += len(text)
+        self.outf.write(text)
+        self.out.clear()
+
+    def flush(self):
+        """ Writes pending output and messages. """
+        if self.out:
+            self.flushOutput()
+        for f in (self.outf,self.messfile):
+            try:
+                f.flush()
+            except (AttributeError,ValueError):
+                pass
+
+    def decodeInstr(self,p):
+        """ Decodes one instruction into (handler, args, advance, weight):
+            'advance' is 0 for jump instructions, which set 'i' themselves;
+            'weight' is the number of MEPA instructions executed.
+        """
+        name = INSTR_DICT[p[1].upper()]
+        args = tuple(p[2])
+        return (getattr(self,name), args, 0 if name in JMP_INSTR else 1, 1)
+
+    def decode(self):
+        """ Decodes program once into a table of instructions. """
+        return [self.decodeInstr(p) for p in self.P]
+
+    def execute(self,MP):
+        """ Main execution function for instruction strings (eval
+            engine), decoded instructions (table engine) or register
+            code (reg engine, see mepa_reg.py).
+        """
+        opts = self.options
+        count = self.reset()
+        limit = opts["limit"]
+
+        if opts["engine"]=="table":
+            if not self.debug and not self.stepexec and self.prof is None \
+               and self.sampleevery is None and self.recorder is None \
+               and self.fastEnabled():
+                if opts["jit"]:
+                    return self.runTrace(MP,limit,count)
+                return self.runFast(MP,limit,count)
+            return self.runTable(MP,limit,count)
+        elif opts["engine"]=="reg":
+            return mepa_reg.execute(self,MP,limit)
+        return self.runEval(MP,limit,count)
+
+    def reset(self):
+        """ Initial machine state of a run, or the state saved in the file
+            of option --resume; returns the number of instructions already
+            executed.
+        """
+        opts = self.options
+
+        # initial register values and memory sizes
+        self.i = 0
+        self.s = -1
+        self.D = opts["displaysize"] * [None]
+
+        self.allocate()
+
+        self.debug = opts["debug"]
+        self.check = not opts["nocheck"]
+        self.stepexec = opts["step"]
+        self.executed = 0
+        self.saved = 0
+        count = 0
+        if opts["resume"] is not None:
+            count = self.restore(opts["resume"])
+        if self.snapevery is not None:
+            self.nextsnap = count+self.snapevery
+        if self.sampleevery is not None:
+            self.nextsample = count+self.sampleevery
+        return count
+
+    #==================================================================
+    # Memory
+    #
+    # Memory is split into values V and types T (0: int, 1: level,
+    # 2: mem addr, 3: prog address, UNDEF: never written), updated in
+    # place; with fixed width integers, values are kept in a typed
+    # array.  Both start with 2*stacksize cells and are extended in place
+    # by chunks of STACK_CHUNK cells when the stack passes their end, so
+    # that handlers, closures and traces holding them see the new cells.
+    # Memory never shrinks; its size in bytes (see cellBytes) may not
+    # exceed option --memlimit.
+    #==================================================================
+
+    def allocate(self):
+        """ Initial memory of a run. """
+        opts = self.options
+        self.cellbytes = cellBytes(opts["intwidth"])
+        self.maxcells = maxCells(opts)
+        size = min(2*opts["stacksize"],self.maxcells)
+        if opts["intwidth"] is None:
+            self.V = size * [None]
+        else:
+            self.V = array(INT_TYPECODES[opts["intwidth"]],[0]) * size
+        self.T = bytearray([UNDEF]) * size
+
+    def grow(self,top):
+        """ Extends memory up to cell 'top' at least; returns False if
+            that exceeds option --memlimit.
+        """
+        V = self.V
+        if top<len(V):
+            return True
+        if top>=self.maxcells:
+            return False
+        n = min((top//STACK_CHUNK+1)*STACK_CHUNK,self.maxcells)-len(V)
+        if self.wrap is None:
+            V.extend(n * [None])
+        else:
+            V.extend(array(V.typecode,[0]) * n)
+        self.T.extend(bytearray([UNDEF]) * n)
+        return True
+
+    def room(self,top):
+        """ Memory up to cell 'top', or stack overflow. """
+        if not self.grow(top):
+            self.Msg(STACK_OVERFLOW % self.options["memlimit"],quit=True,
+                     code=1)
+
+    def peakDepth(self):
+        """ Highest stack reached: cells up to the last one ever written. """
+        n = len(self.T.rstrip(bytearray([UNDEF])))
+        if self.options["engine"]=="reg":    # registers do not set types
+            V = self.V
+            k = len(V)
+            while k>n and V[k-1] is None:
+                k -= 1
+            n = k
+        return n
+
+    def runEval(self,MP,limit,count=0):
+        """ Execution loop over instruction strings; 'count' instructions
+            were already executed.
+        """
+        P = self.P
+        ns = dict((name,getattr(self,name)) for name in INSTR_DICT.values())
+        stop = self.checkpoint(count,limit)
+
+        # execution loop
+        while True:
+            li = self.i
+            try:
+                try:
+                    ins = MP[self.i]
+                except:
+                    self.Msg(PROG_END,quit=True,code=1)
+                if self.debug:
+                    self.deb()
+                par = ins.find('(')
+                if not ins[:par] in JMP_INSTR:
+                    self.i += 1
+                eval(ins,ns)
+                if self.debug:
+                    self.Msg('')
+                if self.stepexec:
+                    stepin = input(">>:")
+                    if stepin:
+                        self.Msg(STOPPING_STEPEXEC)
+                        self.stepexec = False
+                count += 1
+            except AssertionError as e:
+                self.Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+                sys.exit(1)
+            except SystemExit as e:
+                sys.exit(1)
+            except:
+                self.Msg(ILLEGAL_VALUE % li, quit=True)
+            if self.i<0:      # halt()
+                if self.debug:
+                    self.Msg("")
+                self.executed = count
+                self.Msg(EXECUTED_INSTRUCTIONS % count)
+                return -1
+            if count>=stop:
+                stop = self.checkpoint(count,limit)
+
+    def halted(self,count):
+        """ Final messages after a halt instruction. """
+        self.executed = count
+        self.Msg(EXECUTED_INSTRUCTIONS % count)
+        if self.options["fuse"]:
+            self.Msg(SAVED_DISPATCHES % (self.saved,count-self.saved))
+        return -1
+
+    def runTable(self,MP,limit,count=0):
+        """ Execution loop over decoded instructions (see 'decode');
+            'count' instructions were already executed.
+        """
+        P = self.P
+        prof = self.prof
+        if prof is not None:
+            counts, block, back = prof.counts, prof.block, prof.back
+        record = self.recorder.record if self.recorder is not None else None
+        stop = self.checkpoint(count,limit)
+
+        # execution loop
+        while True:
+            li = self.i
+            try:
+                try:
+                    handler, args, advance, weight = MP[self.i]
+                except:
+                    self.Msg(PROG_END,quit=True,code=1)
+                if prof is not None:
+                    counts[li] += 1
+                    if block[li]!=prof.cur:
+                        prof.enter(block[li])
+                if self.debug:
+                    self.deb()
+                if record is not None:
+                    s = self.s
+                self.i += advance
+                handler(*args)
+                if prof is not None and self.i<=li and li in back:
+                    back[li] += 1
+                if record is not None:
+                    record(li,s)
+                if self.debug:
+                    self.Msg('')
+                if self.stepexec:
+                    stepin = input(">>:")
+                    if stepin:
+                        self.Msg(STOPPING_STEPEXEC)
+                        self.stepexec = False
+                count += weight
+            except Deopt:
+                MP[li] = self.decodeInstr(P[li])
+                self.i = li
+            except AssertionError as e:
+                self.Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+                sys.exit(1)
+            except SystemExit as e:
+                sys.exit(1)
+            except:
+                self.Msg(ILLEGAL_VALUE % li, quit=True)
+            if self.i<0:      # halt()
+                if self.debug:
+                    self.Msg("")
+                return self.halted(count)
+            if count>=stop:
+                stop = self.checkpoint(count,limit)
+
+    #==================================================================
+    # Fast loop
+    #
+    # Used by the table engine when there is no debugging or
+    # step-by-step execution.  Each entry holds the address of the next
+    # instruction and instructions are not counted one by one: control
+    # transfers (see 'transfer') add up the instructions executed since
+    # the previous one, which is simply the distance covered.  The limit
+    # is tested only at backward transfers; when it could be reached
+    # before the next one, execution goes on in runTable, which counts
+    # every instruction.
+    #==================================================================
+
+    def fastEnabled(self):
+        """ DBUG and STEP may turn on debugging during execution. """
+        return not any(INSTR_DICT[p[1].upper()] in ("dbug","step")
+                       for p in self.P)
+
+    def fastEntry(self,pc,entry):
+        """ Turns table entry at 'pc' into (handler, args, next address). """
+        handler, args, advance, weight = entry
+        name = handler.__name__
+        if name in BINARY_FUNCTIONS:
+            handler, args = self.fast_binop, (self.functions[name],)
+        elif name in FAST_HANDLERS:
+            handler = getattr(self,FAST_HANDLERS[name])
+        if name in TRANSFER_INSTR:
+            return (self.transfer,(pc,handler,args,weight),pc+advance)
+        return (handler,args,pc+advance)
+
+    def transfer(self,pc,handler,args,weight):
+        """ Executes control transfer instruction at 'pc'. """
+        handler(*args)
+        self.count += pc-self.mark+weight
+        i = self.mark = self.i
+        if i<=pc:
+            if i<0 or self.count>=self.margin:
+                raise Leave
+        elif i>self.end:
+            self.i = self.end      # beyond program end
+
+    def progEnd(self):
+        self.Msg(PROG_END,quit=True,code=1)
+
+    def runFast(self,MP,limit,count=0):
+        """ Execution loop without debugging, stepping and counting. """
+        P = self.P
+        end = self.end = len(MP)
+        margin = limit-end-MAX_WEIGHT
+        if margin<=count:
+            return self.runTable(MP,limit,count)
+        FP = [self.fastEntry(pc,MP[pc]) for pc in range(end)]
+        FP.append((self.progEnd,(),end))
+        self.count = count
+        self.margin = min(self.checkpoint(count,limit),margin)
+        self.mark = self.i
+        pc = self.i
+        while True:
+            try:
+                while True:
+                    handler, args, nxt = FP[pc]
+                    self.i = nxt
+                    handler(*args)
+                    pc = self.i
+            except Leave:
+                if self.i<0 or self.count>=margin:
+                    break
+                self.margin = min(self.checkpoint(self.count,limit),margin)
+                pc = self.i
+            except Deopt:
+                MP[pc] = self.decodeInstr(P[pc])
+                FP[pc] = self.fastEntry(pc,MP[pc])
+                self.i = pc
+            except AssertionError as e:
+                self.Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+                sys.exit(1)
+            except SystemExit as e:
+                sys.exit(1)
+            except:
+                self.Msg(ILLEGAL_VALUE % pc, quit=True)
+        if self.i<0:
+            return self.halted(self.count)
+        return self.runTable(MP,limit,self.count)
+
+    #==================================================================
+    # Trace loop
+    #
+    # Used instead of the fast loop with option --jit (see
+    # mepa_trace.py).  Instructions are executed and counted one by one
+    # as in runTable; backward jumps are counted per loop head, and a
+    # hot head gets its next iteration recorded and compiled.  From then
+    # on, every backward jump to that head calls the compiled trace.
+    #==================================================================
+
+    def runTrace(self,MP,limit,count=0):
+        """ Execution loop with compiled hot loops. """
+        P = self.P
+        back = set()          # addresses of backward jumps
+        for pc in range(len(P)):
+            if INSTR_DICT[P[pc][1].upper()] in ("jmp","jmpf") and \
+               P[pc][2][0]<=pc:
+                back.add(pc)
+        hits = {}             # loop head -> backward jumps to it
+        traces = {}           # loop head -> trace function, or None
+        recording = None      # (address, next address) of current trace
+        stop = self.checkpoint(count,limit)
+
+        # execution loop
+        while True:
+            li = self.i
+            try:
+                try:
+                    handler, args, advance, weight = MP[li]
+                except:
+                    self.Msg(PROG_END,quit=True,code=1)
+                self.i += advance
+                handler(*args)
+                count += 1
+            except AssertionError as e:
+                self.Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+                sys.exit(1)
+            except SystemExit as e:
+                sys.exit(1)
+            except:
+                self.Msg(ILLEGAL_VALUE % li, quit=True)
+            if self.i<0:      # halt()
+                return self.halted(count)
+            if count>=stop:
+                stop = self.checkpoint(count,limit)
+            if recording is not None:
+                recording.append((li,self.i))
+                if len(recording)>mepa_trace.MAX_TRACE:
+                    traces[rechead] = recording = None
+            if li not in back or self.i>li:
+                continue
+            head = self.i
+            if recording is not None:
+                if head==rechead:
+                    traces[head] = mepa_trace.compileTrace(P,recording,recs,
+                                                           len(self.V))
+                    recording = None
+                elif traces.get(head) is not None:
+                    # inner loop runs compiled: not recorded
+                    traces[rechead] = recording = None
+            trace = traces.get(head)
+            if trace is not None:
+                r = trace(self.V,self.T,self.D,self.s,self.write,count,stop)
+                if r is not None:
+                    self.i, count, self.s = r
+                    if count>=stop:
+                        stop = self.checkpoint(count,limit)
+            elif head not in traces and recording is None:
+                hits[head] = hits.get(head,0)+1
+                if hits[head]>=mepa_trace.HOT_LOOP:
+                    recording = []
+                    rechead = head
+                    recs = self.s
+
+    #==================================================================
+    # Time slices
+    #
+    # Used by the scheduler of mepa_sched.py, which runs many machines
+    # in one process.  The table engine runs as a generator: after at
+    # least 'quantum' instructions it yields at the next control
+    # transfer, that is, at the end of a basic block.  A READ finding no
+    # input yields before executing, so that a machine waiting for its
+    # input does not hold the process.
+    #==================================================================
+
+    def slices(self,quantum):
+        """ Generator running program from a fresh machine state in the
+            table engine; yields "ready" after a slice of about 'quantum'
+            instructions and "input" while READ waits for input (see
+            'inputWaiting').  Returns -1 after a halt instruction; errors
+            and budgets raise SystemExit, as in 'run', with 'status' set.
+        """
+        opts = self.options
+        if not self.prepared:
+            self.prepare()
+        if opts["engine"]=="table":
+            MP = self.code
+        else:
+            MP = self.decode()
+            if opts["fuse"]:
+                MP = self.fuse(MP)
+        self.startIO()
+        self.startClocks()
+        self.status = "error"
+        count = self.reset()
+        limit = opts["limit"]
+        stop = self.checkpoint(count,limit)
+        end = count+quantum
+        read = self.read
+
+        # execution loop
+        while True:
+            li = self.i
+            if 0<=li<len(MP) and MP[li][0]==read and self.inputWaiting():
+                yield "input"
+                continue
             try:
-                ins = MP[i]
+                try:
+                    handler, args, advance, weight = MP[li]
+                except:
+                    self.Msg(PROG_END,quit=True,code=1)
+                self.i += advance
+                handler(*args)
+                count += weight
+            except Deopt:
+                MP[li] = self.decodeInstr(self.P[li])
+                self.i = li
+                continue
+            except AssertionError as e:
+                self.Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
+                sys.exit(1)
+            except SystemExit as e:
+                sys.exit(1)
             except:
-                Msg(PROG_END,quit=True,code=1)
-            if debug:
-                deb(P)
-            par = ins.find('(')
-            if not ins[:par] in JMP_INSTR:
-                i += 1
-            eval(ins)
-            if debug:
-                Msg('')
-            if stepexec:
-                stepin = input(">>:")
-                if stepin:
-                    Msg(STOPPING_STEPEXEC)
-                    stepexec = False
-            count += 1
-        except AssertionError as e:
-            Msg("\n"+ILLEGAL_ARGUMENT_TYPE)
-            sys.exit(1)
-        except SystemExit as e:
-            sys.exit(1)
+                self.Msg(ILLEGAL_VALUE % li, quit=True)
+            if self.i<0:      # halt()
+                res = self.halted(count)
+                self.status = "halt"
+                self.flush()
+                return res
+            if count>=stop:
+                stop = self.checkpoint(count,limit)
+            if count>=end and self.i!=li+advance:
+                yield "ready"
+                end = count+quantum
+
+    # Handlers without debugging output
+
+    def fast_binop(self,fn):
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert (T[s-1]==0 or undefined(T[s-1])) and \
+                   (T[s]==0 or undefined(T[s]))
+        v = fn(V[s-1],V[s])
+        s -= 1
+        V[s] = v;  T[s] = 0
+        self.s = s
+
+    def fast_ldvl(self,m,n):
+        V = self.V;  T = self.T
+        d = self.D[m]
+        assert d!=None
+        addr = d+n
+        s = self.s = self.s+1
+        if s>=len(V):
+            self.room(s)
+        V[s] = V[addr];  T[s] = T[addr]
+
+    def fast_stvl(self,m,n):
+        V = self.V;  T = self.T
+        d = self.D[m]
+        assert d!=None
+        addr = d+n
+        s = self.s
+        V[addr] = V[s];  T[addr] = T[s];  self.s = s-1
+
+    def fast_ldct(self,k):
+        s = self.s = self.s+1
+        if s>=len(self.V):
+            self.room(s)
+        self.V[s] = k;  self.T[s] = 0
+
+    def fast_jmpf(self,p):
+        s = self.s
+        if self.check:
+            assert self.T[s]==0 or undefined(self.T[s])
+        v = self.V[s]
+        if not v:
+            if v is None:
+                raise TypeError
+            self.i = p
+        self.s = s-1
+
+    #==================================================================
+    # Superinstructions
+    #
+    # Optional load-time pass fusing instruction sequences frequent in
+    # code generated for Tascal programs.  A superinstruction computes
+    # every value it needs before changing the machine state and leaves
+    # memory exactly as the original sequence would.  Anything unusual
+    # (wrong tags, undefined values, limits) raises Deopt, and the
+    # superinstruction is replaced for good by the plain instruction,
+    # which then reports the error exactly as usual.  With --intwidth,
+    # sequences with constants out of range are not fused (see fits).
+    #==================================================================
+
+    def ldvl_ldvl_op_stvl(self,m1,n1,m2,n2,fn,m3,n3):
+        V = self.V;  T = self.T;  D = self.D
+        try:
+            t = self.s
+            a1 = D[m1]+n1
+            a2 = D[m2]+n2
+            if a2==t+1:
+                a2 = a1
+            if self.check:
+                assert T[a1]==0 and T[a2]==0
+            v = fn(V[a1],V[a2])
+            a3 = D[m3]+n3
+            b, tb = V[a2], T[a2]
+            if t+2>=len(V) and not self.grow(t+2):
+                raise Deopt
         except:
-            Msg(ILLEGAL_VALUE % li, quit=True)
-        if i<0:      # halt()
-            if debug:
-                Msg("")
-            Msg(EXECUTED_INSTRUCTIONS % count)
-            return -1
-        if count>=limit:
-            Msg(MAXIMUM_INSTRUCTIONS_EXCEEDED % limit,quit=True,code=1)
-
-# Auxiliary instruction functions
-
-def unop(op):
-    """ Unary operation. """
-    global s, M, check, debug
-    if check:
-        assert M[s][1]==0
-    top(1)
-    if op=="inv":
-        M[s] = [-M[s][0],0]
-    elif op=="nott":
-        M[s] = [1-M[s][0],0]
-    else:
-        impossible(4)
-
-def binop(op):
-    """ Binary operation. """
-    global s, M, check
-    if check:
-        assert M[s-1][1]==0 and M[s][1]==0
-    top(2)
-    v1 = M[s-1][0]
-    v2 = M[s][0]
-    if op=="add":
-        newval = v1+v2
-    elif op=="subt":
-        newval = v1-v2
-    elif op=="mult":
-        newval = v1*v2
-    elif op=="divi":
-        newval = v1//v2
-    elif op=="andd":
-        newval = v1 and v2
-    elif op=="orr":
-        newval = v1 or v2
-    elif op=="less":
-        newval = v1<v2
-    elif op=="grt":
-        newval = v1>v2
-    elif op=="eql":
-        newval = v1==v2
-    elif op=="dif":
-        newval = v1!=v2
-    elif op=="leq":
-        newval = v1<=v2
-    elif op=="geq":
-        newval = v1>=v2
-    else:
-        impossible(5)
-    
-    s -= 1
-    M[s] = [newval,0]
-
-def memop(op,m,n):
-    """Memory access binary operation. """
-    global s, M, D, check
-    assert D[m]!=None
-    
-    addr = D[m]+n
-    
-    debnum(addr)
-    if op=="ldvl":
-        s += 1;  M[s] = M[addr]
-    elif op=="ldaddr":
-        s += 1;  M[s] = [addr,2]
-    elif op=="stvl":
-        M[addr] = M[s];  s -= 1
-    elif op=="ldvi":
-        if check:
-            assert M[addr][1]==2
-        s += 1;  M[s] = M[M[addr][0]]
-    elif op=="stvi":
-        if check:
-            assert M[addr][1]==2
-        M[M[addr][0]] = M[s];  s -= 1
-    else:
-        impossible(6)
-    
-
-
-# Instructions
-
-def add():
-    binop("add")
-
-def subt():
-    binop("subt")
-    
-def mult():
-    binop("mult")
-
-def divi():
-    binop("divi")
-
-def andd():
-    binop("andd")
-
-def orr():
-    binop("orr")
-
-def less():
-    binop("less")
-
-def grt():
-    binop("grt")
-    
-def eql():
-    binop("eql")
-    
-def dif():
-    binop("dif")
-    
-def leq():
-    binop("leq")
-
-def geq():
-    binop("geq")
-
-def inv():
-    unop("inv")
-
-def nott():
-    unop("nott")
-
-def nop():
-    pass
-    
-def halt():
-    global i
-    i = -1
-
-def read():
-    global s, M, inputline, inf
-    assert len(M)>s
-    while True:
-        if len(inputline)>0:
-            break
-        inputline = inf.readline()
-        if not inputline:
-            Msg("\n"+UNEXPECTED_EOF_INPUT,quit=True,code=1)
-        inputline = inputline[:-1].strip().split()
-    try:
-        v = int(inputline[0])
-        inputline = inputline[1:]
-        s += 1; M[s] = [v,0]
-        top(1)
-    except:
-        Msg(ILLEGAL_INPUT_VALUE,quit=True,code=1)
-    
-def writ():
-    global s, M, outf, debug
-    if check:
-        assert M[s][1]==0
-    top(1)
-    outf.write("%d\n" % M[s][0])
-    s -= 1
-
-def init():
-    global s,D
-    s = -1;  D[0] = 0
-
-def cont():
-    if check:
-        assert M[s][1]==2
-    top(1)
-    M[s] = M[M[s][0]]
-
-def ldct(k):
-    global s, M
-    s += 1;  
-    assert len(M)>s
-    M[s] = [k,0]
-    top(1)
-
-def jmp(p):
-    global i
-    debnum(p)
-    i = p
-
-def jmpf(p):
-    global i, s, M
-    if check:
-        assert M[s][1]==0
-    debnum(p)
-    top(1)
-    if not M[s][0]:
-        i = p
-    s -= 1
-
-def alloc(n):
-    global s
-    s += n
-
-def dealloc(n):
-    global s
-    s -= n
-
-def entproc(k):
-    global s, D, M
-    assert len(D)>k
-    debnum(D[k-1])
-    s += 1
-    assert len(M)>s
-    M[s] = [D[k-1],2]
-    D[k] = s+1
-    
-def retproc(n):
-    global i, s, D, M
-    if check:
-        assert M[s-1][1]==1 and M[s-2][1]==2 and M[s-3][1]==3
-    top(3,1)
-    t = M[s-1][0]
-    D[t] = M[s-2][0]
-    i = M[s-3][0]
-    s -= (n+4)
-    while t>1:
-        if check:
-            assert M[D[t]-1][1]==2
-        D[t-1] = M[D[t]-1][0]
-        t -= 1
-        
-def indx(k):
-    global s, M
-    if check:
-        assert M[s-1][1]==2 and M[s][1]==0
-    top(2)
-    M[s-1] = [M[s-1][0]+M[s][0]*k,2]
-    s -= 1
-
-def ldmv(k):
-    global s, M
-    if check:
-        assert M[s][1]==2
-    assert len(M)>(s+k)
-    top(1)
-    t = M[s][0]
-    M[s:s+k] = M[t:t+k]
-    s += (k-1)
-    
-def stmv(k):
-    global s, M
-    if check:
-        assert M[s-k][1]==2
-    top(1,k)
-    t = M[s-k][0]
-    M[t:t+k] = M[s-k+1:s+1]
-    s -= (k+1)
-
-
-def ldvl(m,n):
-    memop("ldvl",m,n)
-    
-def ldaddr(m,n):
-    memop("ldaddr",m,n)
-    
-def stvl(m,n):
-    memop("stvl",m,n)
-    
-def ldvi(m,n):
-    memop("ldvi",m,n)
-    
-def stvi(m,n):
-    memop("stvi",m,n)  
-    
-def entlabl(j,n):
-    global s, D
-    debnum(D[j])
-    s = D[j]+n-1
-
-def ldgaddr(p,k):
-    global s, D, M
-    assert len(M)>(s+3)
-    M[s+1] = [p,3]
-    M[s+2] = [D[k],2]
-    M[s+3] = [k,1]
-    s += 3
-    top(3)
-
-def call(p,k):
-    global i, s, D, M
-    assert len(M)>(s+3)
-    M[s+1] = [i+1,3]
-    M[s+2] = [D[k],2]
-    M[s+3] = [k,1]
-    s += 3
-    top(3)
-    i = p
-    
-def callpar(m,n,k):
-    global i, s, D, M
-    assert D[m]!=None
-    addr = D[m]+n
-    assert len(M)>(s+3)
-    if check:
-        assert M[addr][1]==3 and M[addr+1][1]==2 and M[addr+2][1]==1
-    debnum(addr)
-    M[s+1] = [i+1,3]
-    M[s+2] = [D[k],2]
-    M[s+3] = [k,1]
-    s += 3
-    top(3)
-    i = M[addr][0]
-    t = M[addr+2][0]
-    D[t] = M[addr+1][0]
-    while t>1:
-        if check:
-            assert M[D[t]-1][1]==2
-        D[t-1] = M[D[t]-1][0]
-        t -= 1
-
-def dbug(t):
-    """ Set on/off debugging flag."""
-    global debug
-    if t and not debug:
-        Msg(STARTING_DEBUGGING)
-    elif debug and not t:
-        Msg(STOPPING_DEBUGGING)
-    debug = t
-
-def step(t):
-    """ Set on/off step execution flag."""
-    global stepexec
-    if t and not stepexec:
-        Msg(STARTING_STEPEXEC)
-    elif stepexec and not t:
-        Msg(STOPPING_STEPEXEC)
-    stepexec = t
-
-def dump():
-    """ Dump everything that can be useful. """
-    global i, s, M, D, labels
-    UndMsg(DUMP,'=',2)
-    Msg("i=%3d, s=%3d" % (i,s))
-    UndMsg(DISPLAY,'-')
-    for k in range(OPTIONS_DICT["displaysize"]):
-        if D[k]!=None:
-            Msg("%2d: %5d" % (k,D[k]))
-    UndMsg(MEMORY,'-')
-    for k in range(OPTIONS_DICT["stacksize"]):
-        if M[k]!=None and M[k][0]!=None:
-            Msg("%2d: %5d (%d)" % (k,M[k][0],M[k][1]))
-    UndMsg(LABELS,'-')
-    for lab in labels:
-        Msg("%-5s:  %d" % (lab,labels[lab]))
-
-    UndMsg(END_DUMP,"=")
-
-
-def deb(P):
-    """Debugging function. """
-    global i, s
-    Msg("i=%3d, s=%3d:      %-20s      " % (i,s,P[i][3]),eol=False)
-
-def top(k,adj=0):
-    """ Prints stack top (adjusted) 'k' values. """
-    global s, M, debug
-    if debug:
-        for i in range(k):
-            stack(s-k+i+1-adj)
-        #Msg("")
-            
-        
-def stack(n):
-    """ Prints M[n]. """
-    global M, debug
-    if debug:
+            raise Deopt
+        V[t+1] = v;  T[t+1] = 0
+        V[t+2] = b;  T[t+2] = tb
+        V[a3] = v;  T[a3] = 0
+        self.saved += 3
+
+    def ldvl_ldct_op_stvl(self,m1,n1,k,fn,m3,n3):
+        V = self.V;  T = self.T;  D = self.D
+        try:
+            t = self.s
+            a1 = D[m1]+n1
+            if self.check:
+                assert T[a1]==0
+            v = fn(V[a1],k)
+            a3 = D[m3]+n3
+            if t+2>=len(V) and not self.grow(t+2):
+                raise Deopt
+        except:
+            raise Deopt
+        V[t+1] = v;  T[t+1] = 0
+        V[t+2] = k;  T[t+2] = 0
+        V[a3] = v;  T[a3] = 0
+        self.saved += 3
+
+    def ldvl_ldvl_op_jmpf(self,m1,n1,m2,n2,fn,p):
+        V = self.V;  T = self.T;  D = self.D
+        try:
+            t = self.s
+            a1 = D[m1]+n1
+            a2 = D[m2]+n2
+            if a2==t+1:
+                a2 = a1
+            if self.check:
+                assert T[a1]==0 and T[a2]==0
+            v = fn(V[a1],V[a2])
+            b, tb = V[a2], T[a2]
+            if t+2>=len(V) and not self.grow(t+2):
+                raise Deopt
+        except:
+            raise Deopt
+        V[t+1] = v;  T[t+1] = 0
+        V[t+2] = b;  T[t+2] = tb
+        if not v:
+            self.i = p
+        self.saved += 3
+
+    def ldvl_ldct_op_jmpf(self,m1,n1,k,fn,p):
+        V = self.V;  T = self.T;  D = self.D
+        try:
+            t = self.s
+            a1 = D[m1]+n1
+            if self.check:
+                assert T[a1]==0
+            v = fn(V[a1],k)
+            if t+2>=len(V) and not self.grow(t+2):
+                raise Deopt
+        except:
+            raise Deopt
+        V[t+1] = v;  T[t+1] = 0
+        V[t+2] = k;  T[t+2] = 0
+        if not v:
+            self.i = p
+        self.saved += 3
+
+    def ldvl_stvl(self,m1,n1,m3,n3):
+        V = self.V;  T = self.T;  D = self.D
+        try:
+            t = self.s
+            a1 = D[m1]+n1
+            a, ta = V[a1], T[a1]
+            a3 = D[m3]+n3
+            if t+1>=len(V) and not self.grow(t+1):
+                raise Deopt
+        except:
+            raise Deopt
+        V[t+1] = a;  T[t+1] = ta
+        V[a3] = a;  T[a3] = ta
+        self.saved += 1
+
+    def ldct_stvl(self,k,m3,n3):
+        V = self.V;  T = self.T
+        try:
+            t = self.s
+            a3 = self.D[m3]+n3
+            if t+1>=len(V) and not self.grow(t+1):
+                raise Deopt
+        except:
+            raise Deopt
+        V[t+1] = k;  T[t+1] = 0
+        V[a3] = k;  T[a3] = 0
+        self.saved += 1
+
+    def ldct_op(self,k,fn):
+        V = self.V;  T = self.T
+        try:
+            t = self.s
+            if t+1>=len(V) and not self.grow(t+1):
+                raise Deopt
+            if self.check:
+                assert T[t]==0
+            v = fn(V[t],k)
+        except:
+            raise Deopt
+        V[t+1] = k;  T[t+1] = 0
+        V[t] = v;  T[t] = 0
+        self.saved += 1
+
+    def fits(self,names,MP,pc,n):
+        """ True if the constants of the n instructions at 'pc' fit in
+            memory cells (see --intwidth).  Storing one that does not fit
+            would fail after part of the state is changed, so such
+            sequences are left to the plain instructions.
+        """
+        if self.wrap is None:
+            return True
+        return all(self.wrap(MP[q][1][0])==MP[q][1][0]
+                   for q in range(pc,pc+n) if names[q]=="ldct")
+
+    def fuse(self,MP):
+        """ Replaces instruction sequences by superinstructions in decoded
+            program MP.  No sequence extends over a jump target, and other
+            addresses do not change.
+        """
+        P = self.P
+        names = [INSTR_DICT[p[1].upper()] for p in P]
+        if self.options["debug"] or self.options["step"] or \
+           "dbug" in names or "step" in names:
+            return MP
+        targets = set(self.labels.values())
+        for pc in range(len(MP)):
+            if names[pc] in ("jmp","jmpf","call","ldgaddr"):
+                targets.add(MP[pc][1][0])
+        fused = list(MP)
+        pc = 0
+        while pc<len(MP):
+            k = 1
+            for seq, handler in FUSIONS:
+                n = len(seq)
+                found = names[pc:pc+n]
+                if len(found)<n or any(q in targets for q in range(pc+1,pc+n)):
+                    continue
+                if all(a==b or (b=="op" and a in BINARY_FUNCTIONS)
+                       for a,b in zip(found,seq)):
+                    if not self.fits(names,MP,pc,n):
+                        continue
+                    args = ()
+                    for q in range(pc,pc+n):
+                        args += fuseArgs(names[q],MP[q][1],self.functions)
+                    fused[pc] = (getattr(self,handler),args,n,n)
+                    k = n
+                    break
+            pc += k
+        return fused
+
+    #==================================================================
+    # Auxiliary instruction functions
+    #==================================================================
+
+    def unop(self,op):
+        """ Unary operation. """
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert T[s]==0 or undefined(T[s])
+        self.top(1)
+        if op=="inv":
+            v = -V[s]
+        elif op=="nott":
+            v = 1-V[s]
+        else:
+            self.impossible(4)
+        if self.wrap is not None:
+            v = self.wrap(v)
+        V[s] = v;  T[s] = 0
+
+    def binop(self,op):
+        """ Binary operation. """
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert (T[s-1]==0 or undefined(T[s-1])) and \
+                   (T[s]==0 or undefined(T[s]))
+        self.top(2)
+        v1 = V[s-1]
+        v2 = V[s]
+        if op not in self.functions:
+            self.impossible(5)
+        newval = self.functions[op](v1,v2)
+
+        s = self.s = s-1
+        V[s] = newval;  T[s] = 0
+
+    def memop(self,op,m,n):
+        """Memory access binary operation. """
+        V = self.V;  T = self.T;  D = self.D
+        assert D[m]!=None
+
+        addr = D[m]+n
+
+        self.debnum(addr)
+        if op in ("ldvl","ldaddr","ldvi") and self.s+1>=len(V):
+            self.room(self.s+1)
+        if op=="ldvl":
+            s = self.s = self.s+1;  V[s] = V[addr];  T[s] = T[addr]
+        elif op=="ldaddr":
+            s = self.s = self.s+1;  V[s] = addr;  T[s] = 2
+        elif op=="stvl":
+            s = self.s;  V[addr] = V[s];  T[addr] = T[s];  self.s = s-1
+        elif op=="ldvi":
+            if self.check:
+                assert T[addr]==2 or undefined(T[addr])
+            s = self.s = self.s+1;  a = V[addr];  V[s] = V[a];  T[s] = T[a]
+        elif op=="stvi":
+            if self.check:
+                assert T[addr]==2 or undefined(T[addr])
+            s = self.s;  a = V[addr];  V[a] = V[s];  T[a] = T[s];  self.s = s-1
+        else:
+            self.impossible(6)
+
+    def link(self,d):
+        """ Display entry d as kept in memory: typed arrays (option
+            --intwidth) hold NO_LINK for entries never set.
+        """
+        if d is None and self.wrap is not None:
+            return NO_LINK
+        return d
+
+    def unlink(self,v):
+        """ Display entry kept in memory as v. """
+        if v==NO_LINK and self.wrap is not None:
+            return None
+        return v
+
+    def cell(self,n):
+        """ Value of memory cell n, as shown by debugging functions. """
+        if self.T[n]==2:
+            return self.unlink(self.V[n])
+        return self.V[n]
+
+    #==================================================================
+    # Instructions
+    #==================================================================
+
+    def add(self):
+        self.binop("add")
+
+    def subt(self):
+        self.binop("subt")
+
+    def mult(self):
+        self.binop("mult")
+
+    def divi(self):
+        self.binop("divi")
+
+    def andd(self):
+        self.binop("andd")
+
+    def orr(self):
+        self.binop("orr")
+
+    def less(self):
+        self.binop("less")
+
+    def grt(self):
+        self.binop("grt")
+
+    def eql(self):
+        self.binop("eql")
+
+    def dif(self):
+        self.binop("dif")
+
+    def leq(self):
+        self.binop("leq")
+
+    def geq(self):
+        self.binop("geq")
+
+    def inv(self):
+        self.unop("inv")
+
+    def nott(self):
+        self.unop("nott")
+
+    def nop(self):
+        pass
+
+    def halt(self):
+        self.i = -1
+
+    def read(self):
+        if self.s+1>=len(self.V):
+            self.room(self.s+1)
+        token = self.readToken()
         try:
-            v,t = M[n]
-            Msg("%d (%d)    " % (v,t),eol=False)
+            v = int(token)
+            s = self.s = self.s+1
+            self.V[s] = v;  self.T[s] = 0
+            self.top(1)
         except:
-            Msg(ILLEGAL_DEBUG_VALUE)
-
-def debnum(addr):
-    """ Prints an address. """
-    global debug
-    if debug:
-        Msg("%d        " % addr,eol=False)
-        
+            self.Msg(ILLEGAL_INPUT_VALUE,quit=True,code=1)
+
+    def writ(self):
+        s = self.s
+        if self.check:
+            assert self.T[s]==0 or undefined(self.T[s])
+        self.top(1)
+        self.write("%d\n" % self.V[s])
+        self.s = s-1
+
+    def init(self):
+        self.s = -1;  self.D[0] = 0
+
+    def cont(self):
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert T[s]==2 or undefined(T[s])
+        self.top(1)
+        a = V[s]
+        V[s] = V[a];  T[s] = T[a]
+
+    def ldct(self,k):
+        s = self.s = self.s+1
+        if s>=len(self.V):
+            self.room(s)
+        self.V[s] = k;  self.T[s] = 0
+        self.top(1)
+
+    def jmp(self,p):
+        self.debnum(p)
+        self.i = p
+
+    def jmpf(self,p):
+        s = self.s
+        if self.check:
+            assert self.T[s]==0 or undefined(self.T[s])
+        self.debnum(p)
+        self.top(1)
+        v = self.V[s]
+        if not v:
+            if v is None:
+                raise TypeError
+            self.i = p
+        self.s = s-1
+
+    def alloc(self,n):
+        self.s += n
+        if self.s>=len(self.V):
+            self.room(self.s)
+
+    def dealloc(self,n):
+        self.s -= n
+
+    def entproc(self,k):
+        D = self.D
+        assert len(D)>k
+        self.debnum(D[k-1])
+        s = self.s = self.s+1
+        if s>=len(self.V):
+            self.room(s)
+        self.V[s] = self.link(D[k-1]);  self.T[s] = 2
+        D[k] = s+1
+
+    def retproc(self,n):
+        V = self.V;  T = self.T;  D = self.D;  s = self.s
+        if self.check:
+            assert (T[s-1]==1 or undefined(T[s-1])) and \
+                   (T[s-2]==2 or undefined(T[s-2])) and \
+                   (T[s-3]==3 or undefined(T[s-3]))
+        self.top(3,1)
+        t = V[s-1]
+        D[t] = self.unlink(V[s-2])
+        self.i = V[s-3]
+        self.s = s-(n+4)
+        while t>1:
+            if self.check:
+                assert T[D[t]-1]==2 or undefined(T[D[t]-1])
+            D[t-1] = self.unlink(V[D[t]-1])
+            t -= 1
+
+    def indx(self,k):
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert (T[s-1]==2 or undefined(T[s-1])) and \
+                   (T[s]==0 or undefined(T[s]))
+        self.top(2)
+        V[s-1] = V[s-1]+V[s]*k;  T[s-1] = 2
+        self.s = s-1
+
+    def ldmv(self,k):
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert T[s]==2 or undefined(T[s])
+        if s+k>=len(V):
+            self.room(s+k)
+        self.top(1)
+        t = V[s]
+        V[s:s+k] = V[t:t+k];  T[s:s+k] = T[t:t+k]
+        self.s = s+(k-1)
+
+    def stmv(self,k):
+        V = self.V;  T = self.T;  s = self.s
+        if self.check:
+            assert T[s-k]==2 or undefined(T[s-k])
+        self.top(1,k)
+        t = V[s-k]
+        V[t:t+k] = V[s-k+1:s+1];  T[t:t+k] = T[s-k+1:s+1]
+        self.s = s-(k+1)
+
+    def ldvl(self,m,n):
+        self.memop("ldvl",m,n)
+
+    def ldaddr(self,m,n):
+        self.memop("ldaddr",m,n)
+
+    def stvl(self,m,n):
+        self.memop("stvl",m,n)
+
+    def ldvi(self,m,n):
+        self.memop("ldvi",m,n)
+
+    def stvi(self,m,n):
+        self.memop("stvi",m,n)
+
+    def entlabl(self,j,n):
+        D = self.D
+        self.debnum(D[j])
+        self.s = D[j]+n-1
+        if self.s>=len(self.V):
+            self.room(self.s)
+
+    def ldgaddr(self,p,k):
+        V = self.V;  T = self.T;  s = self.s
+        if s+3>=len(V):
+            self.room(s+3)
+        V[s+1] = p;  T[s+1] = 3
+        V[s+2] = self.link(self.D[k]);  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        self.s = s+3
+        self.top(3)
+
+    def call(self,p,k):
+        V = self.V;  T = self.T;  s = self.s
+        if s+3>=len(V):
+            self.room(s+3)
+        V[s+1] = self.i+1;  T[s+1] = 3
+        V[s+2] = self.link(self.D[k]);  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        self.s = s+3
+        self.top(3)
+        self.i = p
+
+    def callpar(self,m,n,k):
+        V = self.V;  T = self.T;  D = self.D
+        assert D[m]!=None
+        addr = D[m]+n
+        s = self.s
+        if s+3>=len(V):
+            self.room(s+3)
+        if self.check:
+            assert (T[addr]==3 or undefined(T[addr])) and \
+                   (T[addr+1]==2 or undefined(T[addr+1])) and \
+                   (T[addr+2]==1 or undefined(T[addr+2]))
+        self.debnum(addr)
+        V[s+1] = self.i+1;  T[s+1] = 3
+        V[s+2] = self.link(D[k]);  T[s+2] = 2
+        V[s+3] = k;  T[s+3] = 1
+        self.s = s+3
+        self.top(3)
+        self.i = V[addr]
+        t = V[addr+2]
+        D[t] = self.unlink(V[addr+1])
+        while t>1:
+            if self.check:
+                assert T[D[t]-1]==2 or undefined(T[D[t]-1])
+            D[t-1] = self.unlink(V[D[t]-1])
+            t -= 1
+
+    def dbug(self,t):
+        """ Set on/off debugging flag."""
+        if t and not self.debug:
+            self.Msg(STARTING_DEBUGGING)
+        elif self.debug and not t:
+            self.Msg(STOPPING_DEBUGGING)
+        self.debug = t
+
+    def step(self,t):
+        """ Set on/off step execution flag."""
+        if t and not self.stepexec:
+            self.Msg(STARTING_STEPEXEC)
+        elif self.stepexec and not t:
+            self.Msg(STOPPING_STEPEXEC)
+        self.stepexec = t
+
+    def dump(self):
+        """ Dump everything that can be useful. """
+        V = self.V;  T = self.T;  D = self.D
+        self.UndMsg(DUMP,'=',2)
+        self.Msg("i=%3d, s=%3d" % (self.i,self.s))
+        self.UndMsg(DISPLAY,'-')
+        for k in range(self.options["displaysize"]):
+            if D[k]!=None:
+                self.Msg("%2d: %5d" % (k,D[k]))
+        self.UndMsg(MEMORY,'-')
+        for k in range(self.options["stacksize"]):
+            if self.cell(k)!=None and T[k]!=UNDEF:
+                self.Msg("%2d: %5d (%d)" % (k,self.cell(k),T[k]))
+        self.UndMsg(LABELS,'-')
+        for lab in self.labels:
+            self.Msg("%-5s:  %d" % (lab,self.labels[lab]))
+
+        self.UndMsg(END_DUMP,"=")
+
+    #==================================================================
+    # Debugging
+    #==================================================================
+
+    def deb(self):
+        """Debugging function. """
+        self.Msg("i=%3d, s=%3d:      %-20s      " %
+                 (self.i,self.s,self.P[self.i][3]),eol=False)
+
+    def top(self,k,adj=0):
+        """ Prints stack top (adjusted) 'k' values. """
+        if self.debug:
+            for i in range(k):
+                self.stack(self.s-k+i+1-adj)
+
+    def stack(self,n):
+        """ Prints memory cell n. """
+        if self.debug:
+            try:
+                v,t = self.cell(n),self.T[n]
+                if t==UNDEF:
+                    raise ValueError
+                self.Msg("%d (%d)    " % (v,t),eol=False)
+            except:
+                self.Msg(ILLEGAL_DEBUG_VALUE)
+
+    def debnum(self,addr):
+        """ Prints an address. """
+        if self.debug:
+            self.Msg("%d        " % addr,eol=False)
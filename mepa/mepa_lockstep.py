@@ -0,0 +1,279 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Lockstep execution of one program over many inputs (option --lockstep  #
+# of mepa_batch.py); requires NumPy.                                     #
+#                                                                        #
+# Every input file is a lane.  Each memory cell used by the register     #
+# code of mepa_reg.py is an int64 array with one element per lane, and   #
+# a block runs at once for all the lanes standing at it: instructions    #
+# become array operations over those lanes.  DSVF sends every lane to    #
+# its own next block; the waiting block with the lowest address runs     #
+# next, so that lanes split by a DSVF meet again at the next label.      #
+#                                                                        #
+# Only programs passing the verifier are run, so that no undefined cell  #
+# is ever used.  A lane leaving the common case -- limit close, end of   #
+# input or invalid value, division by zero, result out of 64 bits,       #
+# program end without halt -- retires: its input is run again on its     #
+# own by the interpreter, which reports it exactly as usual.             #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mepa_defs import *
+import mepa_reg
+import mepa_verify
+
+# Lanes run together
+LANES = 1024
+
+# Block of retired lanes
+RETIRED = -3
+
+MIN64 = -2**63
+MAX64 = 2**63-1
+
+def bounds(width):
+    """ Range of values with --intwidth 'width' (64 bits otherwise). """
+    if width=="32":
+        return -2**31, 2**31-1
+    return MIN64, MAX64
+
+def operands(blk):
+    """ Operands of register code block 'blk'. """
+    for op, d, a, b, pc in blk.code:
+        for x in (a,b):
+            if x is not None:
+                yield x
+    if blk.term[0]=="jmpf":
+        c = blk.term[1]
+        if c[0] in BINARY_FUNCTIONS:
+            yield c[1]
+            yield c[2]
+        else:
+            yield c
+
+def convert(P,options):
+    """ Register code of P if it can run in lockstep, otherwise None. """
+    if numpy is None or options["fuse"] or options["memstats"] or \
+       options["timeout"] is not None or options["cputime"] is not None:
+        return None
+    size = maxCells(options)
+    if mepa_verify.verify(P,size) is not None:
+        return None
+    prog = mepa_reg.convert(P,size)
+    if prog is None:
+        return None
+    lo, hi = bounds(options["intwidth"])
+    for blk in prog:
+        for kind, x in operands(blk):
+            if kind=="k" and not lo<=x<=hi:
+                return None
+    return prog
+
+def inputValues(case,lo,hi):
+    """ Values in file 'case' up to the first invalid one, split as by
+        MepaVM.readToken; None if file cannot be read.
+    """
+    try:
+        with open(case,"r") as f:
+            text = f.read()
+    except Exception:
+        return None
+    values = []
+    for token in text[:-1].split():
+        try:
+            v = int(token)
+        except ValueError:
+            break
+        if not lo<=v<=hi:
+            break
+        values.append(v)
+    return values
+
+class Lanes:
+    """ Machine state of a group of lanes running register code. """
+
+    def __init__(self,prog,options,cases):
+        np = numpy
+        n = len(cases)
+        self.prog = prog
+        self.width = options["intwidth"]
+        self.limit = options["limit"]
+        lo, hi = bounds(self.width)
+        self.M = dict((c,np.zeros(n,np.int64))
+                      for c in mepa_reg.registers(prog))
+        self.blk = np.zeros(n,np.int64)
+        self.count = np.zeros(n,np.int64)
+        values = [inputValues(case,lo,hi) for case in cases]
+        for k in range(n):
+            if values[k] is None:
+                self.blk[k] = RETIRED
+                values[k] = []
+        self.ntok = np.array([len(v) for v in values],np.int64)
+        self.tok = np.zeros((n,max(self.ntok.max(),1)),np.int64)
+        for k in range(n):
+            self.tok[k,:len(values[k])] = values[k]
+        self.pos = np.zeros(n,np.int64)
+        self.out = [[] for k in range(n)]
+
+    def retire(self,lanes,bad):
+        """ Retires lanes[bad]; returns the others. """
+        bad = numpy.broadcast_to(bad,lanes.shape)
+        if bad.any():
+            self.blk[lanes[bad]] = RETIRED
+            return lanes[~bad]
+        return lanes
+
+    def value(self,a,lanes):
+        kind, x = a
+        if kind=="k":
+            return numpy.int64(x)
+        return self.M[x][lanes]
+
+    def wrap(self,r):
+        if self.width=="32":
+            return ((r+2**31) & (2**32-1))-2**31
+        return r
+
+    def binop(self,op,x,y):
+        """ Returns (result, lanes to retire) of operation 'op'. """
+        np = numpy
+        exact = self.width is None
+        if op=="add":
+            r = x+y
+            return self.wrap(r), exact and ((x^r)&(y^r))<0
+        elif op=="subt":
+            r = x-y
+            return self.wrap(r), exact and ((x^y)&(x^r))<0
+        elif op=="mult":
+            r = x*y
+            return self.wrap(r), exact and \
+                   np.abs(np.float64(1)*x*y)>=2.0**62
+        elif op=="divi":
+            if exact:
+                bad = (y==0) | ((x==MIN64) & (y==-1))
+                return x//np.where(bad,1,y), bad
+            bad = (y==0) | (x==MIN64) | (y==MIN64)
+            y = np.where(bad,1,y)
+            q = np.abs(x)//np.abs(y)
+            return self.wrap(np.where((x<0)!=(y<0),-q,q)), bad
+        elif op=="andd":
+            return np.where(x!=0,y,x), False
+        elif op=="orr":
+            return np.where(x!=0,x,y), False
+        elif op=="less":
+            r = x<y
+        elif op=="grt":
+            r = x>y
+        elif op=="eql":
+            r = x==y
+        elif op=="dif":
+            r = x!=y
+        elif op=="leq":
+            r = x<=y
+        elif op=="geq":
+            r = x>=y
+        return np.int64(1)*r, False
+
+    def apply(self,op,x,y,lanes):
+        """ Computes operation 'op' on lanes; returns the lanes going on
+            and their results.
+        """
+        r, bad = self.binop(op,x,y)
+        r = numpy.broadcast_to(r,lanes.shape)
+        bad = numpy.broadcast_to(bad,lanes.shape)
+        if bad.any():
+            self.blk[lanes[bad]] = RETIRED
+            return lanes[~bad], r[~bad]
+        return lanes, r
+
+    def instr(self,ins,lanes):
+        """ Runs register instruction on lanes; returns lanes going on. """
+        op, d, a, b, pc = ins
+        if op=="mov":
+            self.M[d][lanes] = self.value(a,lanes)
+        elif op in BINARY_FUNCTIONS:
+            lanes, r = self.apply(op,self.value(a,lanes),
+                                  self.value(b,lanes),lanes)
+            self.M[d][lanes] = r
+        elif op=="inv":
+            lanes, r = self.apply("subt",numpy.int64(0),
+                                  self.value(a,lanes),lanes)
+            self.M[d][lanes] = r
+        elif op=="nott":
+            self.M[d][lanes] = 1-self.value(a,lanes)
+        elif op=="read":
+            lanes = self.retire(lanes,self.pos[lanes]>=self.ntok[lanes])
+            self.M[d][lanes] = self.tok[lanes,self.pos[lanes]]
+            self.pos[lanes] += 1
+        elif op=="writ":
+            values = numpy.broadcast_to(self.value(a,lanes),lanes.shape)
+            out = self.out
+            for k, v in zip(lanes.tolist(),values.tolist()):
+                out[k].append("%d\n" % v)
+        return lanes
+
+    def block(self,b,lanes):
+        """ Runs block b on lanes. """
+        blk = self.prog[b]
+        term = blk.term
+        n = blk.weight
+        if term[0]=="halt":
+            lanes = self.retire(lanes,self.count[lanes]+n>self.limit)
+        else:
+            lanes = self.retire(lanes,self.count[lanes]+n>=self.limit)
+        self.count[lanes] += n
+        for ins in blk.code:
+            if not len(lanes):
+                return
+            lanes = self.instr(ins,lanes)
+        if term[0]=="halt":
+            self.blk[lanes] = mepa_reg.HALT
+            return
+        number = self.number
+        if term[0]=="jmp":
+            self.blk[lanes] = number.get(term[1],RETIRED)
+            return
+        _, c, p, nxt, pc = term
+        if c[0] in BINARY_FUNCTIONS:
+            lanes, r = self.apply(c[0],self.value(c[1],lanes),
+                                  self.value(c[2],lanes),lanes)
+        else:
+            r = self.value(c,lanes)
+        self.blk[lanes] = numpy.where(r!=0,number.get(nxt,RETIRED),
+                                      number.get(p,RETIRED))
+
+    def run(self):
+        """ Runs all lanes until every one halts or retires. """
+        np = numpy
+        prog = self.prog
+        self.number = dict((prog[k].start,k) for k in range(len(prog)))
+        with np.errstate(over="ignore"):    # overflow is tested
+            while True:
+                active = self.blk>=0
+                if not active.any():
+                    break
+                b = self.blk[active].min()
+                self.block(b,np.nonzero(self.blk==b)[0])
+
+def run(prog,options,cases):
+    """ Runs register code 'prog' over input files 'cases' in groups of
+        LANES; returns {case index: (instructions, output)} for the
+        lanes which halted.  The others retired.
+    """
+    res = {}
+    for first in range(0,len(cases),LANES):
+        group = Lanes(prog,options,cases[first:first+LANES])
+        group.run()
+        for k in numpy.nonzero(group.blk==mepa_reg.HALT)[0].tolist():
+            res[first+k] = (int(group.count[k]),"".join(group.out[k]))
+    return res
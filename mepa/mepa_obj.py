@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Precompiled MEPA programs (".mepab" files) and conversion between      #
+# text and binary forms.                                                 #
+#                                                                        #
+# Layout (little endian):                                                #
+#                                                                        #
+#   header   magic "MEPB", version, instruction and label counts         #
+#   code     one fixed-width record per instruction: opcode (index in    #
+#            OPCODES), number of arguments and three 64-bit arguments    #
+#            (labels already resolved)                                   #
+#   labels   one 32-bit address per label                                #
+#   text     UTF-8 source lines, then label names, separated by "\n"     #
+#                                                                        #
+# Opcodes do not depend on the language of the mnemonics; the source     #
+# lines are kept only for debugging output and for conversion back to    #
+# text.                                                                  #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, getopt, struct, mmap
+
+ObjUsage = """
+Usage:
+
+    [python3] mepa_obj.py
+         [--lang pt|en (pt)]
+         <input file> [<output file>]
+
+    Converts a text program into a precompiled one (extension .mepab),
+    or a precompiled program back into text:
+
+         mepa_obj.py ../testes/arquivos_mepacal/P10.mepacal
+"""
+
+if __name__ == "__main__":
+    # mepa_defs chooses the language when imported
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"",["lang="])
+    except getopt.GetoptError:
+        opts, args = [], []
+    for o,a in opts:
+        if o=="--lang":
+            os.environ["MEPA_LANG"] = a
+    os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+
+OBJECT_EXT = ".mepab"
+MAGIC = b"MEPB"
+VERSION = 1
+
+# Opcode numbering of the object format; new instructions go at the end
+OPCODES = [ "add", "subt", "mult", "divi", "inv", "andd", "orr", "nott",
+            "less", "grt", "eql", "dif", "leq", "geq", "nop", "halt",
+            "read", "writ", "init", "cont", "dump",
+            "ldct", "jmp", "jmpf", "alloc", "dealloc", "entproc",
+            "retproc", "indx", "ldmv", "stmv", "dbug", "step",
+            "ldvl", "ldaddr", "stvl", "ldvi", "stvi", "entlabl",
+            "ldgaddr", "call",
+            "callpar" ]
+
+HEADER = struct.Struct("<4sHHII")      # magic, version, 0, code, labels
+RECORD = struct.Struct("<BB3q")        # opcode, nargs, args
+LABEL  = struct.Struct("<i")           # address
+
+def isObject(fname):
+    return fname.endswith(OBJECT_EXT)
+
+def saveObject(P,L,f):
+    """ Writes program (after fixArgs) into binary file f. """
+    code = dict((OPCODES[k],k) for k in range(len(OPCODES)))
+    records = []
+    for p in P:
+        args = p[2]
+        records.append(RECORD.pack(code[INSTR_DICT[p[1].upper()]],
+                                   len(args),*(list(args)+[0,0,0])[:3]))
+    names = sorted(L,key=L.get)
+    text = [p[3] for p in P] + names
+    f.write(HEADER.pack(MAGIC,VERSION,0,len(P),len(L)))
+    f.write(b"".join(records))
+    f.write(b"".join(LABEL.pack(L[lab]) for lab in names))
+    f.write("\n".join(text).encode("utf-8"))
+
+def loadObject(f):
+    """ Reads binary program file f through mmap; returns P and L as
+        inputProgram and fixArgs would.
+    """
+    try:
+        mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    except (ValueError,OSError):
+        Msg(ILLEGAL_OBJECT_FILE,quit=True,code=1)
+    try:
+        return decodeObject(mm)
+    except SystemExit:
+        raise
+    except:
+        Msg(ILLEGAL_OBJECT_FILE,quit=True,code=1)
+    finally:
+        mm.close()
+
+def decodeObject(data):
+    """ Decodes binary program held in 'data' (bytes or mmap); raises
+        ValueError, or other exceptions, when it is not well formed.
+    """
+    mnemonic = {}
+    for m in INSTR_DICT:
+        mnemonic.setdefault(INSTR_DICT[m],m)
+    magic, version, _, ncode, nlabels = HEADER.unpack_from(data,0)
+    if magic!=MAGIC or version!=VERSION:
+        raise ValueError
+    if ncode+1>=OPTIONS_DICT["programsize"]:
+        Msg(PROGRAM_TOO_LARGE,quit=True,code=1)
+    pos = HEADER.size
+    lpos = pos + ncode*RECORD.size
+    tpos = lpos + nlabels*LABEL.size
+    text = data[tpos:].decode("utf-8")
+    text = text.split("\n") if text or ncode+nlabels else []
+    if len(text)!=ncode+nlabels:
+        raise ValueError
+    P = []
+    k = 0
+    for op, n, a1, a2, a3 in RECORD.iter_unpack(data[pos:lpos]):
+        P.append(["",mnemonic[OPCODES[op]],
+                  [a1,a2,a3][:n],text[k]])
+        k += 1
+    L = {}
+    for (addr,) in LABEL.iter_unpack(data[lpos:tpos]):
+        lab = text[k]
+        L[lab] = addr
+        if 0<=addr<ncode:
+            P[addr][0] = lab
+        k += 1
+    return P, L
+
+def saveText(P,f):
+    """ Writes program source lines, as kept in P. """
+    for p in P:
+        f.write(p[3]+"\n")
+    f.write("     %s\n" % END_INSTR)
+
+if __name__ == "__main__":
+
+    if len(args) not in (1,2):
+        sys.stderr.write(ObjUsage)
+        sys.exit(1)
+    OPTIONS_DICT["programsize"] = sys.maxsize   # checked when loaded
+    src = args[0]
+    if isObject(src):
+        dst = args[1] if len(args)>1 else os.path.splitext(src)[0]+".mepa"
+        with open(src,"rb") as f:
+            P, L = loadObject(f)
+        with open(dst,"w") as f:
+            saveText(P,f)
+    else:
+        dst = args[1] if len(args)>1 else os.path.splitext(src)[0]+OBJECT_EXT
+        try:
+            mepa_defs.PROG_FILE = open(src,"r")
+        except FileNotFoundError:
+            Msg(OPEN_FILE_ERROR % src,quit=True,code=1)
+        P, L = inputProgram()
+        fixArgs(P,L)
+        try:
+            with open(dst,"wb") as f:
+                saveObject(P,L,f)
+        except struct.error:
+            os.remove(dst)
+            Msg(ILLEGAL_OBJECT_ARGUMENT,quit=True,code=1)
@@ -0,0 +1,156 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Execution profile (option --profile).                                  #
+#                                                                        #
+# The table engine counts executions of every instruction address and    #
+# the time spent in every basic block; blocks start at labels, at jump   #
+# targets and after control transfers.  Loops are the backward DSVS and  #
+# DSVF jumps: a loop runs from the jump target to the jump, and its      #
+# iterations are the times the jump was taken.  The report gives the     #
+# most executed opcodes, the hot loops and the slowest blocks; the same  #
+# data may be written as JSON (option --proffile).                       #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import time, json
+
+from mepa_defs import *
+
+# Instructions which do not continue at the next address
+TRANSFER = [ "jmp", "jmpf", "retproc", "call", "callpar", "halt" ]
+
+# Lines of each part of the report
+REPORT_LINES = 10
+
+def short(n):
+    """ 1234567 -> '1.2M' """
+    for d,u in ((10**9,"G"),(10**6,"M"),(10**3,"k")):
+        if n>=d:
+            return "%.1f%s" % (n/d,u)
+    return str(n)
+
+class Profile:
+    """ Counters for one execution of program P. """
+
+    def __init__(self,P,L):
+        n = len(P)
+        self.P = P
+        self.names = [INSTR_DICT[p[1].upper()] for p in P]
+        self.labels = {}
+        for lab in L:
+            self.labels.setdefault(L[lab],lab)
+        self.counts = n*[0]
+        self.back = {}            # backward jump address -> times taken
+        leaders = set([0]) | set(a for a in L.values() if 0<=a<n)
+        for pc in range(n):
+            if self.names[pc] in TRANSFER:
+                leaders.add(pc+1)
+            if self.names[pc] in ("jmp","jmpf"):
+                target = P[pc][2][0]
+                leaders.add(target)
+                if target<=pc:
+                    self.back[pc] = 0
+        self.starts = sorted(a for a in leaders if a<n)
+        self.block = n*[0]
+        for b in range(len(self.starts)):
+            for pc in range(self.starts[b],self.end(b)+1):
+                self.block[pc] = b
+        self.times = len(self.starts)*[0.0]
+        self.cur = 0
+        self.t = self.t0 = time.perf_counter()
+
+    def end(self,b):
+        """ Last address of block b. """
+        if b+1<len(self.starts):
+            return self.starts[b+1]-1
+        return len(self.P)-1
+
+    def enter(self,b):
+        """ Execution goes on in block b. """
+        t = time.perf_counter()
+        self.times[self.cur] += t-self.t
+        self.cur = b
+        self.t = t
+
+    def finish(self):
+        self.enter(self.cur)
+        self.seconds = self.t-self.t0
+
+    def name(self,pc):
+        return self.labels.get(pc,str(pc))
+
+    def loops(self):
+        """ (head, jump address, iterations, instructions), the most
+            executed first.
+        """
+        loops = []
+        for pc in self.back:
+            head = self.P[pc][2][0]
+            loops.append((head,pc,self.back[pc],sum(self.counts[head:pc+1])))
+        loops.sort(key=lambda l: -l[3])
+        return loops
+
+    def opcodes(self):
+        ops = {}
+        for pc in range(len(self.P)):
+            if self.counts[pc]:
+                op = self.P[pc][1].upper()
+                ops[op] = ops.get(op,0)+self.counts[pc]
+        return sorted(ops.items(),key=lambda o: -o[1])
+
+    def blocks(self):
+        """ (start, end, entries, instructions, seconds), slowest first. """
+        res = []
+        for b in range(len(self.starts)):
+            start, end = self.starts[b], self.end(b)
+            res.append((start,end,self.counts[start],
+                        sum(self.counts[start:end+1]),self.times[b]))
+        res.sort(key=lambda r: -r[4])
+        return res
+
+    def report(self,msg):
+        """ Prints report through message function 'msg'. """
+        total = sum(self.counts) or 1
+        secs = self.seconds or 1e-9
+        msg(PROFILE_TITLE)
+        msg(PROFILE_OPCODES)
+        for op,n in self.opcodes()[:REPORT_LINES]:
+            msg("  %-8s %12d %6.1f%%" % (op,n,100*n/total))
+        loops = [l for l in self.loops() if l[2]>0]
+        if loops:
+            msg(PROFILE_LOOPS)
+        for head,pc,it,n in loops[:REPORT_LINES]:
+            msg("  "+PROFILE_LOOP % (self.name(head),self.name(pc+1),
+                                     short(it),100*n/total))
+        msg(PROFILE_BLOCKS)
+        for start,end,k,n,t in self.blocks()[:REPORT_LINES]:
+            if n>0:
+                msg("  %-14s %10.4f s %6.1f%% %12d" %
+                    ("%s..%d" % (self.name(start),end),t,100*t/secs,n))
+
+    def dump(self,f):
+        """ Writes profile as JSON into file f. """
+        prof = {
+            "instructions": sum(self.counts),
+            "seconds": self.seconds,
+            "opcodes": dict(self.opcodes()),
+            "addresses": [ { "pc": pc, "label": self.labels.get(pc),
+                             "instruction": self.P[pc][3].strip(),
+                             "count": self.counts[pc] }
+                           for pc in range(len(self.P)) ],
+            "blocks": [ { "start": start, "end": end,
+                          "label": self.labels.get(start),
+                          "entries": k, "instructions": n, "seconds": t }
+                        for start,end,k,n,t in self.blocks() ],
+            "loops": [ { "head": head, "jump": pc,
+                         "label": self.labels.get(head),
+                         "iterations": it, "instructions": n }
+                       for head,pc,it,n in self.loops() ],
+            }
+        json.dump(prof,f,indent=1,ensure_ascii=False)
+        f.write("\n")
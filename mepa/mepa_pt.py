@@ -48,6 +48,31 @@
 #  2015-05-30: fixed open file error detection                           #
 #  2015-05-30: implemented missing instruction JMPL                      #
 #  2015-10-07: detected usage of --step without --progfile               #
+#  2026-10-17: added --engine option and pre-decoded dispatch table      #
+#  2026-10-17: added closure-threaded engine (mepa_closure.py)           #
+#  2026-10-17: added whole-program translation to Python (mepa_aot.py)   #
+#  2026-10-17: added --fuse (superinstructions for the table engine)     #
+#  2026-10-17: memory split into value list and type bytearray           #
+#  2026-10-17: added static verifier (mepa_verify.py) and --verify       #
+#  2026-10-17: fast loop for the table engine without debug/step         #
+#  2026-10-17: precompiled programs (.mepab, mepa_obj.py)                #
+#  2026-10-17: machine state kept in MepaVM objects (reentrant)          #
+#  2026-10-17: batch runner over many input files (mepa_batch.py)        #
+#  2026-10-17: buffered input and output; --interactive                  #
+#  2026-10-17: added --profile and --proffile (mepa_prof.py)             #
+#  2026-10-17: added --jit (hot loop traces, mepa_trace.py)              #
+#  2026-10-17: added register code engine (--engine reg, mepa_reg.py)    #
+#  2026-10-17: added --intwidth 32|64 (wraparound, typed memory arrays)  #
+#  2026-10-17: added mepa_batch.py --lockstep (NumPy, mepa_lockstep.py)  #
+#  2026-10-17: growable stack (--memlimit, --memstats)                   #
+#  2026-10-17: added --timeout, --cputime (status of exhausted budgets)  #
+#  2026-10-17: added --checkpoint-every, --resume (mepa_snap.py)         #
+#  2026-10-17: added cooperative scheduler (mepa_sched.py)               #
+#  2026-10-17: added asyncio execution API (mepa_async.py)               #
+#  2026-10-17: added --cachedir, --cachesize (mepa_cache.py)             #
+#  2026-10-17: added --sample-every, --sample-timer (mepa_sample.py)     #
+#  2026-10-17: added --trace (binary traces, mepa_tracefile.py)          #
+#  2026-10-17: verification by default; added --noverify                 #
 #                                                                        #
 #------------------------------------------------------------------------#
 
@@ -85,7 +110,9 @@ COPY_RIGHT = """
 import sys, traceback, getopt
 import mepa_defs
 from mepa_defs import *
-from mepa_interp import execute
+from mepa_interp import MepaVM
+import mepa_obj
+import mepa_cache
 
 VERSION = "5.0"
 
@@ -124,7 +151,11 @@ if __name__ == "__main__":
                     OPTIONS_DICT[o] = n
                 except:
                     Msg(ILLEGAL_OPTION % (o,a),code=1,quit=True)
-            elif o in FILE_OPTIONS:
+            elif o in FILE_OPTIONS or o in PATH_OPTIONS:
+                OPTIONS_DICT[o] = a
+            elif o in CHOICE_OPTIONS:
+                if a not in CHOICE_OPTIONS[o]:
+                    Msg(ILLEGAL_OPTION % (o,a),code=1,quit=True)
                 OPTIONS_DICT[o] = a
             else:
                 Msg(ILLEGAL_OPTIONS)
@@ -134,7 +165,7 @@ if __name__ == "__main__":
         first = True
         for k in OPTIONS_ORDER:
             v = OPTIONS_DICT[k]
-            if k in FILE_OPTIONS:
+            if k in FILE_OPTIONS and v is not None:
                 v = str(v)
                 if v.startswith("<"):
                     p = v.find("<std")
@@ -157,7 +188,12 @@ if __name__ == "__main__":
                         elif k=="outfile":
                             mepa_defs.OUT_FILE = open(v,"w")
                         elif k=="progfile":  # progfile
-                            mepa_defs.PROG_FILE = open(v,"r")
+                            if mepa_obj.isObject(v):
+                                mepa_defs.PROG_FILE = open(v,"rb")
+                            else:
+                                mepa_defs.PROG_FILE = open(v,"r")
+                        elif k=="proffile":
+                            mepa_defs.PROF_FILE = open(v,"w")
                         else:
                             Msg(INTERNAL_ERROR % 1,code=1,quit=True)
                     except FileNotFoundError:
@@ -174,12 +210,22 @@ if __name__ == "__main__":
             Msg("")
         if OPTIONS_DICT["step"] and mepa_defs.PROG_FILE==sys.stdin:
             Msg(STEP_STDIN,quit=True)
-        P, L = inputProgram()
-        fixArgs(P,L)
+        if "b" in getattr(mepa_defs.PROG_FILE,"mode",""):
+            P, L = mepa_obj.loadObject(mepa_defs.PROG_FILE)
+        elif OPTIONS_DICT["cachedir"] is not None and \
+             mepa_defs.PROG_FILE is not sys.stdin:
+            P, L = mepa_cache.loadProgram(mepa_defs.PROG_FILE,
+                                          OPTIONS_DICT["cachedir"],
+                                          OPTIONS_DICT["cachesize"])
+        else:
+            P, L = inputProgram()
+            fixArgs(P,L)
         #dumpProgram(P)   ###############
-        MP = makeMepa(P)
-        #dumpMepaP(MP)    ###############
-        res = execute(MP,P,L,mepa_defs.MESS_FILE,mepa_defs.IN_FILE,mepa_defs.OUT_FILE)
+        vm = MepaVM(P,L,OPTIONS_DICT,mepa_defs.IN_FILE,mepa_defs.OUT_FILE,
+                    mepa_defs.MESS_FILE)
+        res = vm.run()
+        if res in BUDGETS:
+            sys.exit(1)
         if res!=-1:
             Msg(EXECUTION_ERROR % res,quit=True,code=1)
         Msg("\n")
@@ -0,0 +1,351 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Register code ("reg" engine).                                          #
+#                                                                        #
+# Stack code of the global-level subset generated for Tascal programs    #
+# (the same accepted by mepa_aot.py) is converted into three-address     #
+# code over registers.  As the stack depth is known statically at every  #
+# instruction, every memory cell is a register: cells of the variables   #
+# as well as stack slots.  Within a basic block, loads and constants     #
+# are not pushed but kept as pending operands, and an operation stores   #
+# its result directly into the variable of a following ARMZ, so that     #
+#                                                                        #
+#     CRVL 0,a;  CRVL 0,b;  SOMA;  ARMZ 0,c    becomes    c := a + b     #
+#                                                                        #
+# and an operation followed by DSVF becomes the condition of the jump.   #
+# Operands still pending at the end of a block are stored into their     #
+# slots, so that memory is up to date between blocks.                    #
+#                                                                        #
+# Each block is run after testing that it cannot reach the instruction   #
+# limit; otherwise execution goes on in the table engine from the start  #
+# of the block, which counts every instruction.  Errors are reported for #
+# the same instruction as in mepa_interp.py.                             #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+from mepa_defs import *
+from mepa_aot import decodeSubset, depths, blocks, BINOPS
+
+# Block numbers after the last instruction of a block
+HALT = -1
+END = -2      # program end without halt
+
+class Block:
+    """ Register code of a basic block: 'code' is a list of
+        (operation, destination, operand, operand, address) and 'term'
+        the final jump.  Operands are ("r",register) or ("k",constant).
+    """
+    __slots__ = ("start", "depth", "weight", "code", "term")
+
+    def __init__(self,start,depth,weight):
+        self.start = start
+        self.depth = depth        # stack top on entry
+        self.weight = weight      # MEPA instructions
+        self.code = []
+        self.term = None
+
+#======================================================================
+# Conversion
+#======================================================================
+
+def stackCells(code,S):
+    """ Cells written by pushes, and cells accessed as variables or
+        allocated.
+    """
+    pushed = set()
+    named = set()
+    for pc in range(len(code)):
+        if S[pc] is None:
+            continue
+        name, args = code[pc]
+        s = S[pc]
+        if name in ("ldct","ldvl","read"):
+            pushed.add(s+1)
+        if name in ("ldvl","stvl"):
+            named.add(args[1])
+        elif name=="alloc":
+            named.update(range(s+1,s+args[0]+1))
+    return pushed, named
+
+def convertBlock(code,S,start,end):
+    """ Register code of block start..end-1. """
+    s = S[start]
+    blk = Block(start,s,end-start)
+    emit = blk.code.append
+    stack = {}              # slot -> pending operand
+
+    def pop(p):
+        return stack.pop(p,("r",p))
+
+    def spill(x):
+        """ Stores pending loads of variable x into their slots. """
+        for p in sorted(stack):
+            if stack[p]==("r",x):
+                emit(("mov",p,stack.pop(p),None,None))
+
+    def dest(pc,p):
+        """ Destination of the result of instruction at 'pc' placed in
+            slot 'p': the variable of a following ARMZ, or the slot.
+        """
+        if pc+1<end and code[pc+1][0]=="stvl":
+            x = code[pc+1][1][1]
+            spill(x)
+            return x, 2
+        return p, 1
+
+    pc = start
+    while pc<end:
+        name, args = code[pc]
+        k = 1
+        if name=="init":
+            s = -1
+            stack.clear()
+        elif name=="alloc":
+            s += args[0]
+        elif name=="dealloc":
+            s -= args[0]
+        elif name=="ldct":
+            s += 1
+            stack[s] = ("k",args[0])
+        elif name=="ldvl":
+            s += 1
+            stack[s] = ("r",args[1])
+        elif name=="stvl":
+            a = pop(s)
+            s -= 1
+            x = args[1]
+            spill(x)
+            if a!=("r",x):
+                emit(("mov",x,a,None,pc))
+        elif name in BINOPS:
+            b = pop(s)
+            a = pop(s-1)
+            s -= 1
+            if pc+1<end and code[pc+1][0]=="jmpf":
+                blk.term = ("jmpf",(name,a,b),code[pc+1][1][0],pc+2,pc)
+                s -= 1
+                k = 2
+            else:
+                d, k = dest(pc,s)
+                emit((name,d,a,b,pc))
+                s -= k-1
+        elif name in ("inv","nott","read"):
+            if name=="read":
+                s += 1
+                a = None
+            else:
+                a = pop(s)
+            d, k = dest(pc,s)
+            emit((name,d,a,None,pc))
+            s -= k-1
+        elif name=="writ":
+            emit(("writ",None,pop(s),None,pc))
+            s -= 1
+        elif name=="jmpf":
+            blk.term = ("jmpf",pop(s),args[0],pc+1,pc)
+            s -= 1
+        elif name=="jmp":
+            blk.term = ("jmp",args[0])
+        elif name=="halt":
+            blk.term = ("halt",)
+        # nop: no code
+        pc += k
+    for p in sorted(stack):
+        if p<=s:
+            emit(("mov",p,stack[p],None,None))
+    if blk.term is None:
+        blk.term = ("jmp",end)
+    return blk
+
+def registers(prog):
+    """ Memory cells used by register code 'prog'. """
+    cells = set()
+    for blk in prog:
+        for op, d, a, b, pc in blk.code:
+            if d is not None:
+                cells.add(d)
+            cells.update(x[1] for x in (a,b) if x is not None and x[0]=="r")
+        if blk.term[0]=="jmpf":
+            c = blk.term[1]
+            for x in (c[1:] if c[0] in BINARY_FUNCTIONS else (c,)):
+                if x[0]=="r":
+                    cells.add(x[1])
+    return cells
+
+def convert(P,size):
+    """ Returns the list of blocks of the register code of program P,
+        or None if P is outside the supported subset.
+    """
+    code = decodeSubset(P)
+    if not code:
+        return None
+    S = depths(code,size)
+    if S is None:
+        return None
+    pushed, named = stackCells(code,S)
+    if pushed & named:
+        return None       # variables in stack slots: keep the stack
+    leaders = [q for q in blocks(code,S) if q<len(code)]
+    starts = set(leaders)
+    res = []
+    for start in leaders:
+        end = start+1
+        while end<len(code) and end not in starts and \
+              code[end-1][0] not in ("jmp","jmpf","halt"):
+            end += 1
+        res.append(convertBlock(code,S,start,end))
+    return res
+
+#======================================================================
+# Execution
+#
+# For every run, each register instruction becomes a closure over the
+# memory of the machine; a block is (weight, closures, condition,
+# next block, jump block, address of the jump).
+#======================================================================
+
+def operand(V,a):
+    """ Closure returning the value of operand a. """
+    kind, x = a
+    if kind=="k":
+        return lambda: x
+    return lambda: V[x]
+
+def make(V,ins,read,write):
+    op, d, a, b, pc = ins
+    if op=="mov":
+        kind, x = a
+        if kind=="k":
+            def mov():
+                V[d] = x
+        else:
+            def mov():
+                V[d] = V[x]
+        return mov
+    elif op in BINARY_FUNCTIONS:
+        fn = BINARY_FUNCTIONS[op]
+        (ka, x), (kb, y) = a, b
+        if ka=="r" and kb=="r":
+            def binop():
+                V[d] = fn(V[x],V[y])
+        elif ka=="r":
+            def binop():
+                V[d] = fn(V[x],y)
+        elif kb=="r":
+            def binop():
+                V[d] = fn(x,V[y])
+        else:
+            def binop():
+                V[d] = fn(x,y)
+        return binop
+    elif op=="inv":
+        val = operand(V,a)
+        def inv():
+            V[d] = -val()
+        return inv
+    elif op=="nott":
+        val = operand(V,a)
+        def nott():
+            V[d] = 1-val()
+        return nott
+    elif op=="read":
+        def rd():
+            V[d] = read()
+        return rd
+    elif op=="writ":
+        val = operand(V,a)
+        def writ():
+            write("%d\n" % val())
+        return writ
+
+def condition(V,c):
+    """ Closure computing the condition of a DSVF. """
+    if c[0] in BINARY_FUNCTIONS:
+        fn = BINARY_FUNCTIONS[c[0]]
+        a, b = operand(V,c[1]), operand(V,c[2])
+        return lambda: fn(a(),b())
+    val = operand(V,c)
+    def test():
+        v = val()
+        if v is None:
+            raise TypeError
+        return v
+    return test
+
+def bind(prog,V,read,write):
+    """ Closures of register code 'prog' over memory V. """
+    number = dict((prog[k].start,k) for k in range(len(prog)))
+    res = []
+    for blk in prog:
+        body = [(make(V,ins,read,write),ins[4]) for ins in blk.code]
+        term = blk.term
+        if term[0]=="halt":
+            res.append((blk.weight,body,None,HALT,HALT,None))
+        elif term[0]=="jmp":
+            nxt = number.get(term[1],END)
+            res.append((blk.weight,body,None,nxt,nxt,None))
+        else:
+            _, c, p, nxt, pc = term
+            res.append((blk.weight,body,condition(V,c),
+                        number.get(nxt,END),number.get(p,END),pc))
+    return res
+
+def execute(vm,prog,limit):
+    """ Runs register code 'prog' on the memory of MepaVM object 'vm',
+        whose registers are already initialized.
+    """
+    Msg = vm.Msg
+    V = vm.V
+    token = vm.readToken
+
+    def read():
+        t = token()
+        try:
+            v = int(t)
+        except:
+            Msg(ILLEGAL_INPUT_VALUE,quit=True,code=1)
+        return v
+
+    vm.room(max(registers(prog),default=0))
+    code = bind(prog,V,read,vm.write)
+    vm.D[0] = 0
+    count = 0
+    b = 0
+    pc = 0
+    stop = vm.checkpoint(count,limit)
+    try:
+        while b>=0:
+            n, body, cond, nxt, jump, tpc = code[b]
+            if count+n>=stop:
+                if stop<limit:
+                    stop = vm.checkpoint(count,limit)
+                if count+n>=limit and not (nxt==HALT and count+n==limit):
+                    break
+            count += n
+            for fn, pc in body:
+                fn()
+            if cond is None:
+                b = nxt
+            else:
+                pc = tpc
+                b = nxt if cond() else jump
+    except SystemExit as e:
+        sys.exit(1)
+    except:
+        Msg(ILLEGAL_VALUE % pc, quit=True)
+    if b==HALT:
+        return vm.halted(count)
+    if b==END:
+        Msg(PROG_END,quit=True,code=1)
+    # the limit may be reached in block b
+    blk = prog[b]
+    vm.i = blk.start
+    vm.s = blk.depth
+    for c in range(len(V)):
+        vm.T[c] = UNDEF if V[c] is None else 0
+    return vm.runTable(vm.decode(),limit,count)
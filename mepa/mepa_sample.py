@@ -0,0 +1,145 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Sampling profile (options --sample-every, --sample-timer and           #
+# --samplefile).                                                         #
+#                                                                        #
+# Unlike --profile, nothing is done per instruction: the address of the  #
+# current instruction is recorded every N instructions (at the           #
+# checkpoints of the machine) or on every tick of a CPU time timer       #
+# (SIGPROF).  The call stack is recovered from the activation records:   #
+# a procedure at level k has its record at D[k], below which CHPR left   #
+# the return address, the saved display entry and the level; returns     #
+# are replayed on a copy of the display to find each caller's record.    #
+# Every address belongs to the procedure whose ENPR reaches it without   #
+# following calls (address 0 starts the main program).                   #
+#                                                                        #
+# Samples go to a ring buffer, so that a long run keeps the most recent  #
+# ones, and are written as folded stacks, one line per distinct stack    #
+# ("main;proc;instruction count"), as read by flame graph tools.  The    #
+# last frame is the source line of the instruction, when the program     #
+# keeps it.                                                              #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import collections
+
+from mepa_defs import *
+
+# Samples kept
+SAMPLE_BUFFER = 65536
+
+# Deepest call stack recorded
+MAX_DEPTH = 1000
+
+MAIN = -1       # procedure of the main program
+
+class Sampler:
+    """ Samples of one execution of program P. """
+
+    def __init__(self,P,L,size=SAMPLE_BUFFER):
+        n = len(P)
+        self.P = P
+        self.names = [INSTR_DICT[p[1].upper()] for p in P]
+        self.labels = {}
+        for lab in L:
+            self.labels.setdefault(L[lab],lab)
+        self.samples = collections.deque(maxlen=size)
+        self.taken = 0
+        self.level = {MAIN: 0}
+        roots = [MAIN]
+        for pc in range(n):
+            if self.names[pc]=="entproc":
+                self.level[pc] = P[pc][2][0]
+                roots.append(pc)
+        self.proc = n*[None]      # address -> procedure (ENPR address)
+        for root in roots:
+            work = [max(root,0)]
+            while work:
+                pc = work.pop()
+                if not 0<=pc<n or self.proc[pc] is not None or \
+                   (pc!=root and pc in self.level):
+                    continue
+                self.proc[pc] = root
+                name = self.names[pc]
+                if name in ("jmp","jmpf"):
+                    work.append(P[pc][2][0])
+                if name not in ("jmp","halt","retproc"):
+                    work.append(pc+1)
+
+    def sample(self,vm):
+        """ Records the current instruction and call stack of MepaVM
+            object 'vm'.
+        """
+        self.taken += 1
+        i = vm.i
+        stack = [i]
+        n = len(self.P)
+        e = self.proc[i] if 0<=i<n else None
+        if e is not None and e!=MAIN:
+            V, T, s = vm.V, vm.T, vm.s
+            D = list(vm.D)        # display as each return would leave it
+            # before ENPR, the record is not complete
+            b = s+2 if i==e else D[self.level[e]]
+            while len(stack)<MAX_DEPTH:
+                if b is None or not 4<=b<=s+2 or \
+                   T[b-4]!=3 or T[b-3]!=2 or T[b-2]!=1:
+                    break
+                site = V[b-4]-1
+                t = V[b-2]
+                if not 0<=site<n or not 0<=t<len(D):
+                    break
+                D[t] = vm.unlink(V[b-3])
+                while t>1 and D[t] is not None and 1<=D[t]<=s+1 and \
+                      T[D[t]-1]==2:
+                    D[t-1] = vm.unlink(V[D[t]-1])
+                    t -= 1
+                stack.append(site)
+                e = self.proc[site]
+                if e is None or e==MAIN:
+                    break
+                b = D[self.level[e]]
+        self.samples.append(tuple(stack))
+
+    def procName(self,e):
+        if e==MAIN:
+            return "main"
+        if e is None:
+            return "?"
+        return self.labels.get(e,str(e))
+
+    def line(self,pc):
+        """ Last frame: source line of instruction at 'pc'. """
+        if not 0<=pc<len(self.P):
+            return str(pc)
+        p = self.P[pc]
+        text = p[3] if len(p)>3 else ""
+        text = " ".join(text.split(";")[0].split())
+        if not text:
+            text = " ".join([p[1]]+[str(a) for a in p[2]])
+            if p[0]:
+                text = p[0]+": "+text
+        return "%d %s" % (pc,text)
+
+    def folded(self):
+        """ (stack, samples) for every distinct stack, most frequent
+            first.
+        """
+        res = []
+        for stack, k in collections.Counter(self.samples).most_common():
+            frames = [self.procName(self.proc[a]) if 0<=a<len(self.P)
+                      else "?" for a in reversed(stack)]
+            frames.append(self.line(stack[0]))
+            res.append((";".join(frames),k))
+        return res
+
+    def dump(self,f):
+        """ Writes folded stacks into file f; returns their number. """
+        stacks = self.folded()
+        for stack, k in stacks:
+            f.write("%s %d\n" % (stack,k))
+        return len(stacks)
@@ -0,0 +1,314 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Cooperative scheduler running many MEPA programs in one process, as    #
+# for interactive sessions served by a single worker.                    #
+#                                                                        #
+# Every session has its own machine (MepaVM), input queue and output     #
+# buffers.  Machines run in the table engine as generators (see          #
+# MepaVM.slices): a session runs for a slice of about 'quantum'          #
+# instructions, ending at a basic block boundary, and then goes to the   #
+# end of the queue of its priority.  The queue with the lowest priority  #
+# number is always served first; sessions of equal priority take turns.  #
+# A session whose READ finds no input leaves the queues until something  #
+# is fed to it (Session.feed) or its input is closed (Session.close).    #
+#                                                                        #
+# --limit is the budget of each session.  The command line takes no      #
+# --timeout or --cputime; given through the options of Scheduler.add,    #
+# their clocks start at the first slice of the session and also run      #
+# while other sessions execute.                                          #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, time, getopt, json, collections
+
+SchedUsage = """
+Usage:
+
+    [python3] mepa_sched.py
+         [--lang pt|en (pt)]
+         [--quantum <integer> (1000)]
+         [--intwidth 32|64 (none)]
+         [--fuse (False)]
+         [--nocheck (False)]
+         [--limit <integer> (10000)]
+         [--stacksize <integer> (500)]
+         [--memlimit <integer> (67108864)]
+         [--displaysize <integer> (10)]
+         <program file> <input file> [<program file> <input file> ...]
+
+    Runs all programs together, each one with its input file, which is
+    fed one line at a time whenever the program waits for input.  One
+    JSON line is reported per program as it finishes:
+
+         mepa_sched.py P10.mepacal in1 P10.mepacal in2 P05.mepacal in3
+"""
+
+MACHINE_OPTIONS = [ "intwidth=", "fuse", "nocheck", "limit=", "stacksize=",
+                    "memlimit=", "displaysize=" ]
+
+if __name__ == "__main__":
+    # mepa_defs chooses the language when imported
+    def usage():
+        sys.stderr.write(SchedUsage)
+        sys.exit(1)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"",
+                                   ["lang=","quantum="]+MACHINE_OPTIONS)
+    except getopt.GetoptError:
+        usage()
+    for o,a in opts:
+        if o=="--lang":
+            os.environ["MEPA_LANG"] = a
+    os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+from mepa_interp import MepaVM
+
+# Instructions of a slice
+QUANTUM = 1000
+
+class Input:
+    """ Input queue of a session, read by the machine a line at a time.
+        As from a terminal, a line is complete at its end of line; lines
+        without values are dropped, since READ skips them anyway.
+    """
+
+    def __init__(self):
+        self.lines = collections.deque()
+        self.partial = ""
+        self.closed = False
+
+    def feed(self,text):
+        lines = (self.partial+text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.append(line+"\n")
+
+    def close(self):
+        if self.partial:
+            self.append(self.partial)
+            self.partial = ""
+        self.closed = True
+
+    def append(self,line):
+        # the machine drops the last character of a line (see readToken)
+        if line[:-1].split():
+            self.lines.append(line)
+
+    def readline(self):
+        if self.lines:
+            return self.lines.popleft()
+        return ""               # end of input
+
+    def ready(self):
+        """ READ may go on: a line is waiting, or end of input. """
+        return bool(self.lines) or self.closed
+
+class Output:
+    """ Output (or message) buffer of a session. """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self,text):
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        """ Text written since the previous call. """
+        text = "".join(self.parts)
+        self.parts.clear()
+        return text
+
+class Session:
+    """ Program running under Scheduler 'sched'.  'state' is "ready"
+        (waiting for its turn), "input" (waiting for input), or, when
+        finished, the status of the machine: "halt", "error" or a budget
+        (see MepaVM.run).
+    """
+
+    def __init__(self,sched,name,P,L,options,priority):
+        self.sched = sched
+        self.name = name
+        self.priority = priority
+        self.input = Input()
+        self.output = Output()
+        self.messages = Output()
+        options = dict(options or {},interactive=True)
+        options.setdefault("engine","table")
+        self.vm = MepaVM(P,L,options,self.input,self.output,self.messages)
+        self.state = "ready"
+        self.code = None          # exit code the interpreter would return
+        self.slices = self.vm.slices(sched.quantum)
+
+    def feed(self,text):
+        """ Appends 'text' to the input of the session. """
+        self.input.feed(text)
+        self.sched.wake(self)
+
+    def close(self):
+        """ End of input: READ without input fails from now on. """
+        self.input.close()
+        self.sched.wake(self)
+
+    def finished(self):
+        return self.state not in ("ready","input")
+
+    def step(self):
+        """ Runs one slice; returns the new state. """
+        try:
+            self.state = next(self.slices)
+        except StopIteration:
+            self.state = "halt"
+            self.code = 0
+        except SystemExit as e:
+            self.vm.flush()
+            self.state = self.vm.status or "error"
+            self.code = e.code or 0
+        return self.state
+
+class Scheduler:
+    """ Sessions run in slices of 'quantum' instructions. """
+
+    def __init__(self,quantum=QUANTUM):
+        self.quantum = quantum
+        self.queues = {}          # priority -> sessions ready to run
+        self.sessions = []
+
+    def add(self,name,P,L,options=None,priority=0):
+        """ New session running program P (with labels L); lower
+            priority numbers run first.
+        """
+        session = Session(self,name,P,L,options,priority)
+        self.sessions.append(session)
+        self.enqueue(session)
+        return session
+
+    def enqueue(self,session):
+        self.queues.setdefault(session.priority,
+                               collections.deque()).append(session)
+
+    def wake(self,session):
+        """ Input arrived for 'session'. """
+        if session.state=="input":
+            session.state = "ready"
+            self.enqueue(session)
+
+    def step(self):
+        """ Runs one slice of the next session; returns it, or None if no
+            session is ready.
+        """
+        for p in sorted(self.queues):
+            queue = self.queues[p]
+            if queue:
+                break
+            del self.queues[p]
+        else:
+            return None
+        session = queue.popleft()
+        if session.step()=="ready":
+            queue.append(session)
+        return session
+
+    def run(self):
+        """ Runs until every session has finished or waits for input. """
+        while self.step() is not None:
+            pass
+
+def load(fname):
+    """ Reads a text program. """
+    try:
+        mepa_defs.PROG_FILE = open(fname,"r")
+    except FileNotFoundError:
+        Msg(OPEN_FILE_ERROR % fname,quit=True,code=1)
+    P, L = inputProgram()
+    mepa_defs.PROG_FILE.close()
+    fixArgs(P,L)
+    return P, L
+
+def report(session,inputs):
+    """ Report line of a finished session. """
+    vm = session.vm
+    print(json.dumps({ "program": session.name,
+                       "input": inputs[session],
+                       "status": session.state,
+                       "code": session.code,
+                       "instructions": vm.executed
+                                       if session.state=="halt" else None,
+                       "output": session.output.take(),
+                       "messages": session.messages.take() },
+                     ensure_ascii=False))
+
+if __name__ == "__main__":
+
+    if len(args)<2 or len(args)%2:
+        usage()
+    quantum = QUANTUM
+    for o,a in opts:
+        o = o[2:]
+        if o=="quantum" or o in INT_OPTIONS:
+            try:
+                n = int(a)
+                if n<=0:
+                    raise ValueError
+            except ValueError:
+                Msg(ILLEGAL_OPTION % (o,a),quit=True,code=1)
+            if o=="quantum":
+                quantum = n
+            else:
+                OPTIONS_DICT[o] = n
+        elif o in BOOL_OPTIONS:
+            OPTIONS_DICT[o] = True
+        elif o in CHOICE_OPTIONS:
+            if a not in CHOICE_OPTIONS[o]:
+                Msg(ILLEGAL_OPTION % (o,a),quit=True,code=1)
+            OPTIONS_DICT[o] = a
+
+    sched = Scheduler(quantum)
+    inputs = {}                   # session -> input file name
+    files = {}                    # session -> lines not yet fed
+    programs = {}
+    for k in range(0,len(args),2):
+        fname, case = args[k], args[k+1]
+        if fname not in programs:
+            programs[fname] = load(fname)
+        P, L = programs[fname]
+        session = sched.add(fname,P,L,dict(OPTIONS_DICT,engine="table"))
+        try:
+            with open(case,"r") as f:
+                files[session] = collections.deque(
+                                     f.read().splitlines(keepends=True))
+        except FileNotFoundError:
+            Msg(OPEN_FILE_ERROR % case,quit=True,code=1)
+        inputs[session] = case
+
+    t0 = time.perf_counter()
+    errors = 0
+    running = list(sched.sessions)
+    while running:
+        sched.run()
+        # every session left is waiting: one more line each
+        for session in running:
+            if session.state=="input":
+                lines = files[session]
+                if lines:
+                    session.feed(lines.popleft())
+                else:
+                    session.close()
+        for session in [s for s in running if s.finished()]:
+            report(session,inputs)
+            if session.state!="halt":
+                errors += 1
+            running.remove(session)
+    Msg(SCHED_SUMMARY % (len(sched.sessions),errors,
+                         time.perf_counter()-t0))
@@ -0,0 +1,146 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Snapshots of a running machine (options --checkpoint-every, --snapfile #
+# and --resume).                                                         #
+#                                                                        #
+# Layout (little endian):                                                #
+#                                                                        #
+#   header   magic "MEPS", version, integer width (0: unbounded),        #
+#            program checksum, registers i and s, instructions executed  #
+#            and saved by superinstructions, input tokens read, output   #
+#            characters written, display entries and value format        #
+#   display  one 64-bit entry per display level (-1: never set)          #
+#   types    one byte per memory cell up to s (plus NONE: the cell holds #
+#            None, as a display entry never set, with its value saved 0) #
+#   values   memory cells up to s, as 64-bit (32-bit with --intwidth 32) #
+#            integers or, when some value does not fit, as decimal text  #
+#                                                                        #
+# Only the live part of memory (cells 0..s) is written, so the cost of   #
+# a snapshot depends on the stack height and not on --stacksize.  The    #
+# file is written under a temporary name and then renamed, so that a     #
+# process stopped while writing leaves the previous snapshot intact.     #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import os, struct, zlib
+from array import array
+
+from mepa_defs import *
+
+MAGIC = b"MEPS"
+VERSION = 2
+
+# magic, version, width, checksum, i, s, count, saved, tokens read,
+# characters written, display entries, value format
+HEADER = struct.Struct("<4sHHIqqqqqqII")
+
+# Value formats
+FIXED = 0       # typed array
+TEXT = 1        # decimal text
+
+# Added to the type of a cell holding None
+NONE = 0x80
+
+class SnapshotError(Exception):
+    """ Snapshot file cannot be used for this program. """
+    pass
+
+def checksum(P):
+    """ Checksum of program P, independent of the mnemonics' language. """
+    text = "\n".join("%s %s" % (INSTR_DICT[p[1].upper()],
+                                " ".join(str(a) for a in p[2]))
+                     for p in P)
+    return zlib.crc32(text.encode("utf-8"))
+
+def widthCode(vm):
+    width = vm.options["intwidth"]
+    return 0 if width is None else int(width)
+
+def save(vm,count,fname):
+    """ Writes the state of MepaVM object 'vm' after 'count' instructions
+        into file 'fname'.
+    """
+    s = vm.s
+    width = vm.options["intwidth"]
+    cells = vm.V[:s+1]
+    types = bytearray(vm.T[:s+1])
+    if width is not None:
+        fmt, values = FIXED, cells.tobytes()
+    else:
+        for k in range(s+1):
+            if cells[k] is None and types[k]!=UNDEF:
+                types[k] |= NONE
+        cells = [0 if v is None else int(v) for v in cells]
+        if all(-2**63<=v<2**63 for v in cells):
+            fmt, values = FIXED, array("q",cells).tobytes()
+        else:
+            fmt = TEXT
+            values = " ".join(str(v) for v in cells).encode("ascii")
+    display = array("q",[-1 if d is None else d for d in vm.D])
+    tmp = fname+".tmp"
+    with open(tmp,"wb") as f:
+        f.write(HEADER.pack(MAGIC,VERSION,widthCode(vm),checksum(vm.P),
+                            vm.i,s,count,vm.saved,vm.consumed,vm.written,
+                            len(display),fmt))
+        f.write(display.tobytes())
+        f.write(types)
+        f.write(values)
+    os.replace(tmp,fname)
+
+def load(vm,fname):
+    """ Restores into MepaVM object 'vm', whose memory is already
+        allocated, the state saved in file 'fname'; returns the number of
+        instructions executed.  Raises SnapshotError if the file was not
+        written by 'save' for the same program and integer width.
+    """
+    with open(fname,"rb") as f:
+        data = f.read()
+    if len(data)<HEADER.size:
+        raise SnapshotError
+    magic, version, width, check, i, s, count, saved, consumed, written, \
+        levels, fmt = HEADER.unpack_from(data)
+    if magic!=MAGIC or version!=VERSION or s<-1 or \
+       levels!=len(vm.D) or fmt not in (FIXED,TEXT):
+        raise SnapshotError
+    if width!=widthCode(vm) or check!=checksum(vm.P):
+        raise SnapshotError
+    pos = HEADER.size
+    if len(data)<pos+8*levels:
+        raise SnapshotError
+    display = array("q")
+    display.frombytes(data[pos:pos+8*levels])
+    pos += 8*levels
+    types = data[pos:pos+s+1]
+    pos += s+1
+    if fmt==TEXT:
+        values = [int(v) for v in data[pos:].split()]
+    else:
+        code = "q" if vm.options["intwidth"] is None else vm.V.typecode
+        values = array(code)
+        if (len(data)-pos) % values.itemsize:
+            raise SnapshotError
+        values.frombytes(data[pos:])
+    if len(types)!=s+1 or len(values)!=s+1:
+        raise SnapshotError
+
+    vm.room(s)
+    if vm.options["intwidth"] is None:
+        vm.V[:s+1] = [None if types[k]==UNDEF or types[k] & NONE
+                      else values[k] for k in range(s+1)]
+        types = bytes(t if t==UNDEF else t & ~NONE for t in types)
+    else:
+        vm.V[:s+1] = values
+    vm.T[:s+1] = types
+    vm.D[:] = [None if d<0 else d for d in display]
+    vm.i = i
+    vm.s = s
+    vm.saved = saved
+    for k in range(consumed):
+        vm.readToken()
+    vm.written = written
+    return count
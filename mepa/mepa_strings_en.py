@@ -45,6 +45,8 @@ ILLEGAL_ARGUMENT = "Illegal argument or undefined label in line %3d"
 ILLEGAL_ARGUMENT_TYPE = "Illegal argument type in an instruction or some limit exceeded"
 EXECUTED_INSTRUCTIONS = "\nExecuted %d instructions\n"
 MAXIMUM_INSTRUCTIONS_EXCEEDED = "Maximum number of instructions exceeded (%d)"
+TIMEOUT_EXCEEDED = "Maximum execution time exceeded (%d ms)"
+CPUTIME_EXCEEDED = "Maximum CPU time exceeded (%d ms)"
 UNEXPECTED_EOF_INPUT = "Unexpected end of input file"
 ILLEGAL_INPUT_VALUE = "Illegal input value"
 PROG_END = "Program end reached without a stop instruction"
@@ -60,3 +62,48 @@ END_DUMP = "\nEnd dump"
 ILLEGAL_DEBUG_VALUE = "Illegal value in debugging"
 OPEN_FILE_ERROR = "Open file '%s' error"
 ILLEGAL_VALUE = "Illegal value found during interpretation of instruction %d"
+SAVED_DISPATCHES = "%d dispatches saved by superinstructions (%d dispatches)"
+STACK_OVERFLOW = "Stack overflow: memory would exceed %d bytes (--memlimit)"
+MEMORY_STATS = "Stack: up to %d cells; memory: %d cells, %d bytes"
+ILLEGAL_SNAPSHOT_FILE = "Snapshot file '%s' does not belong to this program"
+RESUMED_SNAPSHOT = "Resumed after %d instructions; output continues at character %d"
+
+PROFILE_TITLE = "\nExecution profile"
+PROFILE_OPCODES = "\nMost executed instructions:"
+PROFILE_LOOPS = "\nHot loops:"
+PROFILE_LOOP = "%s..%s ran %s iterations, %.1f%% of instructions"
+PROFILE_BLOCKS = "\nSlowest blocks (time, instructions):"
+SAMPLE_TIMER_UNAVAILABLE = "Timer sampling (--sample-timer) is not available here; ignored"
+SAMPLES_WRITTEN = "%d samples (%d stacks) written to '%s'"
+TRACE_WRITTEN = "%d instructions traced into '%s'"
+
+# mepa_verify.py
+
+VERIFY_REJECTED = "Program rejected by the verifier (%3d):  %s"
+VERIFY_NOT_COVERED = "Program not covered by the verifier (%3d):  %s; running with checks"
+VERIFY_UNSUPPORTED = "instruction not covered by the verifier"
+VERIFY_DEPTH = "inconsistent stack height"
+VERIFY_TYPE = "operand type not guaranteed"
+VERIFY_ADDRESS = "address outside memory"
+VERIFY_TARGET = "jump to nonexistent address"
+VERIFY_NO_INIT = "memory access before INPP"
+
+# mepa_obj.py
+
+ILLEGAL_OBJECT_FILE = "Illegal precompiled program file"
+ILLEGAL_OBJECT_ARGUMENT = "Argument does not fit in 64 bits"
+
+# mepa_batch.py
+
+BATCH_SUMMARY = "%d cases (%d with errors) in %.2f s"
+LOCKSTEP_NO_NUMPY = "--lockstep requires NumPy; cases run one by one"
+LOCKSTEP_UNSUPPORTED = "Program cannot run with --lockstep; cases run one by one"
+LOCKSTEP_SUMMARY = "--lockstep: %d cases completed together, %d run one by one"
+
+# mepa_sched.py
+
+SCHED_SUMMARY = "%d programs (%d with errors) in %.2f s"
+
+# mepa_tracefile.py
+
+ILLEGAL_TRACE_FILE = "Illegal trace file"
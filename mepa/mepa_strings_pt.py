@@ -45,6 +45,8 @@ ILLEGAL_ARGUMENT = "Argumento inválido ou rótulo indefinido na linha %3d"
 ILLEGAL_ARGUMENT_TYPE = "Tipo de argumento inválido para uma instrução ou algum limite excedido"
 EXECUTED_INSTRUCTIONS = "\n%d instruções executadas\n"
 MAXIMUM_INSTRUCTIONS_EXCEEDED = "Número máximo de instruções executadas excedido (%d)"
+TIMEOUT_EXCEEDED = "Tempo máximo de execução excedido (%d ms)"
+CPUTIME_EXCEEDED = "Tempo máximo de CPU excedido (%d ms)"
 UNEXPECTED_EOF_INPUT = "Fim inesperado do arquivo de entrada"
 ILLEGAL_INPUT_VALUE = "Valor de entrada inválido"
 PROG_END = "Atingido o fim do programa sem a instrução de parada"
@@ -60,3 +62,48 @@ END_DUMP = "\nFim de despejo"
 ILLEGAL_DEBUG_VALUE = "Valor inválido para depuração"
 OPEN_FILE_ERROR = "Erro na abertura do arquivo '%s'"
 ILLEGAL_VALUE = "Valor inválido encontrado durante a interpretação da instrução %d"
+SAVED_DISPATCHES = "%d despachos evitados por superinstruções (%d despachos)"
+STACK_OVERFLOW = "Estouro da pilha: memória excederia %d bytes (--memlimit)"
+MEMORY_STATS = "Pilha: até %d células; memória: %d células, %d bytes"
+ILLEGAL_SNAPSHOT_FILE = "Arquivo de instantâneo '%s' não pertence a este programa"
+RESUMED_SNAPSHOT = "Retomada após %d instruções; a saída continua no caractere %d"
+
+PROFILE_TITLE = "\nPerfil de execução"
+PROFILE_OPCODES = "\nInstruções mais executadas:"
+PROFILE_LOOPS = "\nLaços mais executados:"
+PROFILE_LOOP = "%s..%s executou %s iterações, %.1f%% das instruções"
+PROFILE_BLOCKS = "\nBlocos mais demorados (tempo, instruções):"
+SAMPLE_TIMER_UNAVAILABLE = "Amostragem por temporizador (--sample-timer) indisponível aqui; ignorada"
+SAMPLES_WRITTEN = "%d amostras (%d pilhas) gravadas em '%s'"
+TRACE_WRITTEN = "%d instruções registradas em '%s'"
+
+# mepa_verify.py
+
+VERIFY_REJECTED = "Programa rejeitado pelo verificador (%3d):  %s"
+VERIFY_NOT_COVERED = "Programa não coberto pelo verificador (%3d):  %s; executado com verificações"
+VERIFY_UNSUPPORTED = "instrução não coberta pelo verificador"
+VERIFY_DEPTH = "altura da pilha inconsistente"
+VERIFY_TYPE = "tipo do operando não garantido"
+VERIFY_ADDRESS = "endereço fora da memória"
+VERIFY_TARGET = "desvio para endereço inexistente"
+VERIFY_NO_INIT = "acesso à memória antes de INPP"
+
+# mepa_obj.py
+
+ILLEGAL_OBJECT_FILE = "Arquivo de programa pré-compilado inválido"
+ILLEGAL_OBJECT_ARGUMENT = "Argumento não cabe em 64 bits"
+
+# mepa_batch.py
+
+BATCH_SUMMARY = "%d casos (%d com erro) em %.2f s"
+LOCKSTEP_NO_NUMPY = "--lockstep requer NumPy; casos executados um a um"
+LOCKSTEP_UNSUPPORTED = "Programa não pode ser executado com --lockstep; casos executados um a um"
+LOCKSTEP_SUMMARY = "--lockstep: %d casos concluídos juntos, %d executados um a um"
+
+# mepa_sched.py
+
+SCHED_SUMMARY = "%d programas (%d com erro) em %.2f s"
+
+# mepa_tracefile.py
+
+ILLEGAL_TRACE_FILE = "Arquivo de rastro inválido"
@@ -0,0 +1,164 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Compilation of hot loop traces (option --jit).                         #
+#                                                                        #
+# The table engine counts the backward jumps to each loop head; when a   #
+# head gets hot, the addresses executed in one iteration are recorded    #
+# and turned into a Python function running further iterations.  Each    #
+# DSVF of the trace becomes a guard which leaves the function when the   #
+# branch goes the other way.                                             #
+#                                                                        #
+# On entry the function checks that the stack top is the one seen when   #
+# recording, and that every memory cell used holds an integer; then      #
+# variables and stack cells are kept in local variables and written      #
+# back on every exit, leaving memory exactly as the interpreter would.   #
+# Anything that could fail (division by zero, the instruction limit)     #
+# leaves the function before the instruction, which the interpreter      #
+# then executes and reports as usual.                                    #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+from mepa_defs import *
+from mepa_aot import BINOPS
+
+# Backward jumps to a loop head before its trace is recorded
+HOT_LOOP = 16
+
+# Longest trace (instructions)
+MAX_TRACE = 400
+
+SUBSET = [ "ldct", "ldvl", "stvl", "inv", "nott", "writ", "jmp", "jmpf",
+           "nop" ] + list(BINOPS)
+
+class Trace:
+    """ Source of a trace function; exits are expanded at the end. """
+
+    def __init__(self):
+        self.lines = []
+
+    def emit(self,ind,text):
+        self.lines.append("    "*ind + text)
+
+    def exit(self,ind,target,depth,k):
+        self.lines.append((ind,target,depth,k))
+
+def compileTrace(P,path,s0,size):
+    """ Returns function running iterations of the loop recorded in
+        'path', the list of (address, next address) of one iteration
+        from the loop head, entered with stack top 's0'; 'size' is the
+        memory size.  Returns None if the loop cannot be compiled.
+
+        The function is called as f(V,T,D,s,write,count,limit) at the
+        loop head.  It returns None if it cannot run, otherwise the
+        triple (next address, instruction count, stack top).
+    """
+    head = path[0][0]
+    if path[-1][1]!=head or len(path)>MAX_TRACE:
+        return None
+    body = Trace()
+    vars = {}             # (level, displacement) -> local variable number
+    written = set()
+    d = 0                 # stack height above s0
+    maxd = 0
+
+    def var(m,n):
+        if (m,n) not in vars:
+            vars[(m,n)] = len(vars)
+        return "v%d" % vars[(m,n)]
+
+    for k in range(len(path)):
+        pc, nxt = path[k]
+        name = INSTR_DICT[P[pc][1].upper()]
+        args = P[pc][2]
+        if name not in SUBSET:
+            return None
+        need = 2 if name in BINOPS else (1 if name in
+               ("stvl","inv","nott","writ","jmpf") else 0)
+        if d<need:        # operand pushed before the loop
+            return None
+        if name=="ldct":
+            d += 1
+            body.emit(2,"c%d = %d" % (d,args[0]))
+        elif name=="ldvl":
+            d += 1
+            body.emit(2,"c%d = %s" % (d,var(*args)))
+        elif name=="stvl":
+            body.emit(2,"%s = c%d" % (var(*args),d))
+            written.add(var(*args))
+            d -= 1
+        elif name in BINOPS:
+            if name=="divi":
+                body.emit(2,"if c%d == 0:" % d)
+                body.exit(3,pc,d,k)
+            body.emit(2,"c%d = " % (d-1) +
+                      BINOPS[name] % ("c%d" % (d-1),"c%d" % d))
+            d -= 1
+        elif name=="inv":
+            body.emit(2,"c%d = -c%d" % (d,d))
+        elif name=="nott":
+            body.emit(2,"c%d = 1-c%d" % (d,d))
+        elif name=="writ":
+            body.emit(2,'write("%%d\\n" %% c%d)' % d)
+            d -= 1
+        elif name=="jmpf":
+            d -= 1
+            if args[0]!=pc+1:
+                if nxt==pc+1:
+                    body.emit(2,"if not c%d:" % (d+1))
+                    body.exit(3,args[0],d,k+1)
+                else:
+                    body.emit(2,"if c%d:" % (d+1))
+                    body.exit(3,pc+1,d,k+1)
+        # jmp, nop: no code
+        maxd = max(maxd,d)
+    if d!=0 or maxd==0 or s0+maxd>=size:
+        return None
+
+    n = len(path)
+    levels = sorted(set(m for m,_ in vars))
+    addrs = ["a%d" % vars[v] for v in sorted(vars,key=vars.get)]
+    cells = ", ".join("c%d" % p for p in range(1,maxd+1)) + ","
+    top = "V[%d:%d]" % (s0+1,s0+maxd+1)
+    src = Trace()
+    src.emit(0,"def trace(V,T,D,s,write,count,limit):")
+    src.emit(1,"if s != %d: return None" % s0)
+    for m in levels:
+        src.emit(1,"d%d = D[%d]" % (m,m))
+        src.emit(1,"if d%d is None: return None" % m)
+    for (m,disp),j in sorted(vars.items(),key=lambda v: v[1]):
+        src.emit(1,"a%d = d%d+%d" % (j,m,disp))
+        src.emit(1,"if not 0 <= a%d <= %d or T[a%d]: return None" % (j,s0,j))
+    if len(addrs)>1:
+        src.emit(1,"if len({%s}) != %d: return None" %
+                 (", ".join(addrs),len(addrs)))
+    src.emit(1,"if T[%d:%d] != ZEROS: return None" % (s0+1,s0+maxd+1))
+    for a in addrs:
+        src.emit(1,"v%s = V[%s]" % (a[1:],a))
+    src.emit(1,"%s = %s" % (cells,top))
+
+    src.emit(1,"while True:")
+    src.emit(2,"if count+%d > limit:" % n)
+    src.exit(3,head,0,0)
+    src.lines += body.lines
+    src.emit(2,"count += %d" % n)
+
+    # every exit writes locals back
+    lines = src.lines
+    src.lines = []
+    for line in lines:
+        if isinstance(line,str):
+            src.lines.append(line)
+            continue
+        ind, target, depth, k = line
+        for v in sorted(written):
+            src.emit(ind,"V[a%s] = %s" % (v[1:],v))
+        src.emit(ind,"%s = [%s]" % (top,cells[:-1]))
+        src.emit(ind,"return %d, count+%d, %d" % (target,k,s0+depth))
+    ns = { "ZEROS": bytes(maxd) }
+    exec(compile("\n".join(src.lines),"<mepa-trace>","exec"),ns)
+    return ns["trace"]
@@ -0,0 +1,216 @@
+#! /usr/bin/env python3
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Binary execution traces (option --trace) and their decoder; not to be  #
+# confused with the loop traces of --jit (mepa_trace.py).                #
+#                                                                        #
+# Layout (little endian):                                                #
+#                                                                        #
+#   header   magic "MEPT", version, record size, program length          #
+#   program  the program in the format of mepa_obj.py (empty when some   #
+#            argument does not fit in 64 bits)                           #
+#   records  one fixed-size record per instruction executed: its         #
+#            address and the register s before it, then the value and    #
+#            type of the stack top after it (type UNDEF: no value; plus  #
+#            TRUNCATED: value kept modulo 2**64) and its opcode (see     #
+#            mepa_obj.py)                                                #
+#                                                                        #
+# Records are packed into a preallocated buffer, written out when full.  #
+# A trace cut short (process killed) keeps every complete record.  The   #
+# decoder prints the records in the form of --debug, which also shows s  #
+# before the instruction and the stack top after it:                     #
+#                                                                        #
+#   i= 12, s=  3:      CRVL 0,0                  7 (0)                   #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import sys, os, io, getopt, struct
+
+TraceUsage = """
+Usage:
+
+    [python3] mepa_tracefile.py
+         [--lang pt|en (pt)]
+         [--first <integer> (0)]
+         [--count <integer> (all)]
+         <trace file>
+
+    Prints the records of a trace written with option --trace:
+
+         mepa_pt.py --trace P10.trace --progfile P10.mepacal
+         mepa_tracefile.py --first 1000 --count 50 P10.trace
+"""
+
+if __name__ == "__main__":
+    # mepa_defs chooses the language when imported
+    def usage():
+        sys.stderr.write(TraceUsage)
+        sys.exit(1)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"",["lang=","first=","count="])
+    except getopt.GetoptError:
+        usage()
+    for o,a in opts:
+        if o=="--lang":
+            os.environ["MEPA_LANG"] = a
+    os.environ.setdefault("MEPA_LANG","pt")
+
+import mepa_defs
+from mepa_defs import *
+import mepa_obj
+
+MAGIC = b"MEPT"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHI")       # magic, version, record, program
+RECORD = struct.Struct("<iiqBB")       # pc, s, value, type, opcode
+
+TRUNCATED = 0x80
+
+# Records of the buffer
+TRACE_BUFFER = 65536
+
+class TraceError(Exception):
+    """ File is not a trace. """
+    pass
+
+class Recorder:
+    """ Trace of MepaVM object 'vm' into binary file f. """
+
+    def __init__(self,vm,f,size=TRACE_BUFFER):
+        self.vm = vm
+        self.f = f
+        self.buf = bytearray(size*RECORD.size)
+        self.pos = 0
+        self.count = 0
+        code = dict((mepa_obj.OPCODES[k],k)
+                    for k in range(len(mepa_obj.OPCODES)))
+        self.ops = [code[INSTR_DICT[p[1].upper()]] for p in vm.P]
+        program = io.BytesIO()
+        try:
+            mepa_obj.saveObject(vm.P,vm.labels,program)
+        except struct.error:
+            program = io.BytesIO()
+        program = program.getvalue()
+        f.write(HEADER.pack(MAGIC,VERSION,RECORD.size,len(program)))
+        f.write(program)
+
+    def record(self,pc,s):
+        """ Instruction at 'pc' was executed, with register s equal to
+            's' before it.
+        """
+        vm = self.vm
+        top = vm.s
+        if 0<=top<len(vm.V):
+            v, t = vm.V[top], vm.T[top]
+            if t==2:
+                v = vm.unlink(v)
+            if t==UNDEF or v is None:
+                v, t = 0, UNDEF
+            elif not -2**63<=v<2**63:
+                v = (v+2**63) % 2**64 - 2**63
+                t |= TRUNCATED
+        else:
+            v, t = 0, UNDEF
+        RECORD.pack_into(self.buf,self.pos,pc,s,v,t,self.ops[pc])
+        self.pos += RECORD.size
+        self.count += 1
+        if self.pos==len(self.buf):
+            self.flush()
+
+    def flush(self):
+        self.f.write(memoryview(self.buf)[:self.pos])
+        self.pos = 0
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+def read(f):
+    """ Reads trace file f; returns the program (P, L, or None) and an
+        iterator over the records (pc, s, value, type, opcode).
+    """
+    data = f.read(HEADER.size)
+    if len(data)<HEADER.size:
+        raise TraceError
+    magic, version, size, n = HEADER.unpack(data)
+    if magic!=MAGIC or version!=VERSION or size!=RECORD.size:
+        raise TraceError
+    program = f.read(n)
+    if len(program)!=n:
+        raise TraceError
+    PL = None
+    if n:
+        OPTIONS_DICT["programsize"] = sys.maxsize
+        try:
+            PL = mepa_obj.decodeObject(program)
+        except Exception:
+            raise TraceError
+
+    def records():
+        chunk = TRACE_BUFFER*RECORD.size
+        rest = b""
+        while True:
+            data = f.read(chunk)
+            if not data:
+                return
+            data = rest+data
+            end = len(data)-len(data)%RECORD.size
+            yield from RECORD.iter_unpack(data[:end])
+            rest = data[end:]
+
+    return PL, records()
+
+def text(P,pc,s,v,t,op):
+    """ Record in the form of --debug. """
+    if P is not None and 0<=pc<len(P):
+        instr = P[pc][3]
+    else:
+        instr = mepa_obj.OPCODES[op] if op<len(mepa_obj.OPCODES) else "?"
+    line = "i=%3d, s=%3d:      %-20s      " % (pc,s,instr)
+    if t!=UNDEF:
+        line += "%d%s (%d)" % (v,"..." if t & TRUNCATED else "",
+                               t & ~TRUNCATED)
+    return line.rstrip()
+
+if __name__ == "__main__":
+
+    if len(args)!=1:
+        usage()
+    first, count = 0, None
+    for o,a in opts:
+        if o in ("--first","--count"):
+            try:
+                n = int(a)
+                if n<0:
+                    raise ValueError
+            except ValueError:
+                Msg(ILLEGAL_OPTION % (o[2:],a),quit=True,code=1)
+            if o=="--first":
+                first = n
+            else:
+                count = n
+    try:
+        f = open(args[0],"rb")
+    except OSError:
+        Msg(OPEN_FILE_ERROR % args[0],quit=True,code=1)
+    try:
+        PL, records = read(f)
+        P = PL[0] if PL is not None else None
+        k = 0
+        for rec in records:
+            if count is not None and k>=first+count:
+                break
+            if k>=first:
+                print(text(P,*rec))
+            k += 1
+    except TraceError:
+        Msg(ILLEGAL_TRACE_FILE,quit=True,code=1)
+    except BrokenPipeError:
+        pass
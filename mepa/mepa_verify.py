@@ -0,0 +1,227 @@
+
+#------------------------------------------------------------------------#
+# See mepa.py file for description, history and copyright.               #
+#------------------------------------------------------------------------#
+
+#------------------------------------------------------------------------#
+#                                                                        #
+# Static verification of MEPA programs.                                  #
+#                                                                        #
+# An abstract interpretation over the control flow graph computes, for   #
+# every reachable instruction, the stack top 's' and the type of each    #
+# memory cell (0..3 as in mepa_interp.py, UNDEF for cells never written  #
+# and None where paths disagree).  A program is verified when the type   #
+# checks of the interpreter can never fail: every operand has exactly    #
+# the expected type on every path.  Such programs run without checks,    #
+# as with --nocheck, and behave exactly as with them; --noverify skips   #
+# the verifier and keeps the checks.                                     #
+#                                                                        #
+# Only the global-level subset generated for Tascal programs is          #
+# analysed (see SUBSET).  Programs outside it, or with some type not     #
+# proven, keep the checks; under --verify they are reported as not       #
+# covered, and malformed programs (see MALFORMED) are rejected.          #
+#                                                                        #
+#------------------------------------------------------------------------#
+
+import gc
+from mepa_defs import *
+
+SUBSET = [ "init", "alloc", "dealloc", "ldct", "ldvl", "stvl",
+           "add", "subt", "mult", "divi", "inv",
+           "andd", "orr", "nott",
+           "less", "grt", "eql", "dif", "leq", "geq",
+           "jmp", "jmpf", "read", "writ", "nop", "halt",
+           "dbug", "step", "dump" ]
+
+# Reasons of malformed programs; other reasons only leave the checks on
+MALFORMED = [ VERIFY_DEPTH, VERIFY_ADDRESS, VERIFY_TARGET ]
+
+class Reject(Exception):
+    """ Raised with the reason why a program cannot be verified. """
+    pass
+
+# Cell types are kept in chunks of CHUNK cells shared among states: an
+# instruction copies only the chunk it writes, and joins skip the chunks
+# two states still share.
+CHUNK = 64
+EMPTY = (UNDEF,)*CHUNK
+
+class State:
+    """ Abstract machine state before an instruction. """
+    __slots__ = ("s", "init", "mem")
+
+    def __init__(self,s,init,mem):
+        self.s = s
+        self.init = init     # INPP executed: D[0] is 0
+        self.mem = mem       # tuple of chunks of cell types; UNDEF above
+
+    def chunk(self,k):
+        if k<len(self.mem):
+            return self.mem[k]
+        return EMPTY
+
+    def get(self,c):
+        k, j = divmod(c,CHUNK)
+        return self.chunk(k)[j]
+
+    def join(self,other):
+        """ Returns joined state, or None if no change. """
+        if self.s!=other.s:
+            raise Reject(VERIFY_DEPTH)
+        init = self.init and other.init
+        changed = init!=self.init
+        mem = []
+        for k in range(max(len(self.mem),len(other.mem))):
+            a = self.chunk(k)
+            b = other.chunk(k)
+            if a is not b and a!=b:
+                c = tuple(t1 if t1==t2 else None for t1,t2 in zip(a,b))
+                if c!=a:
+                    a = c
+                    changed = True
+            mem.append(a)
+        if not changed:
+            return None
+        return State(self.s,init,tuple(mem))
+
+class Cells:
+    """ Cell types modified by one instruction. """
+
+    def __init__(self,state,size):
+        self.state = state
+        self.size = size
+        self.mem = None      # chunks, copied at the first 'set'
+        self.unproven = None # reason why some check may fail
+
+    def cell(self,c):
+        if c<0 or c>=self.size:
+            raise Reject(VERIFY_ADDRESS)
+        return c
+
+    def get(self,c):
+        return self.state.get(self.cell(c))
+
+    def expect(self,c,t):
+        if self.get(c)!=t and self.unproven is None:
+            self.unproven = VERIFY_TYPE
+
+    def set(self,c,t):
+        self.cell(c)
+        if self.mem is None:
+            self.mem = list(self.state.mem)
+        k, j = divmod(c,CHUNK)
+        while len(self.mem)<=k:
+            self.mem.append(EMPTY)
+        chunk = list(self.mem[k])
+        chunk[j] = t
+        self.mem[k] = tuple(chunk)
+
+    def result(self):
+        if self.mem is None:
+            return self.state.mem
+        return tuple(self.mem)
+
+def step(P,pc,st,size):
+    """ Returns list of (successor, state) of instruction at 'pc', and
+        the reason why its checks may fail, or None.
+    """
+    p = P[pc]
+    name = INSTR_DICT[p[1].upper()]
+    args = p[2]
+    if name not in SUBSET:
+        raise Reject(VERIFY_UNSUPPORTED)
+    m = Cells(st,size)
+    s = st.s
+    init = st.init
+    succ = [pc+1]
+    if name in ("ldvl","stvl"):
+        if args[0]!=0:
+            raise Reject(VERIFY_UNSUPPORTED)
+        if not init:
+            m.unproven = VERIFY_NO_INIT
+    if name=="init":
+        s = -1;  init = True
+    elif name=="alloc":
+        s += args[0]
+    elif name=="dealloc":
+        s -= args[0]
+    elif name in ("ldct","read"):
+        s += 1;  m.set(s,0)
+    elif name=="ldvl":
+        t = m.get(args[1])
+        s += 1;  m.set(s,t)
+    elif name=="stvl":
+        m.set(args[1],m.get(s))
+        s -= 1
+    elif name in BINARY_FUNCTIONS:
+        m.expect(s-1,0);  m.expect(s,0)
+        s -= 1;  m.set(s,0)
+    elif name in ("inv","nott"):
+        m.expect(s,0)
+    elif name=="writ":
+        m.expect(s,0)
+        s -= 1
+    elif name=="jmp":
+        succ = [args[0]]
+    elif name=="jmpf":
+        m.expect(s,0)
+        s -= 1
+        succ = [pc+1,args[0]]
+    elif name=="halt":
+        succ = []
+    # nop, dbug, step, dump: no effect
+    for q in succ:
+        if q<0 or q>len(P):
+            raise Reject(VERIFY_TARGET)
+    new = State(s,init,m.result())
+    return [(q,new) for q in succ if q<len(P)], m.unproven   # len(P): end
+
+def walk(P,size):
+    """ Abstract interpretation of P; result as in verify. """
+    states = [None]*len(P)
+    if not P:
+        return None
+    states[0] = State(-1,False,())
+    work = [0]
+    pending = set(work)
+    unproven = None
+    while work:
+        pc = work.pop()
+        pending.discard(pc)
+        try:
+            succ, reason = step(P,pc,states[pc],size)
+            if reason is not None and unproven is None:
+                unproven = (pc,reason)
+            for q,st in succ:
+                if states[q] is None:
+                    states[q] = st
+                else:
+                    try:
+                        st = states[q].join(st)
+                    except Reject as e:
+                        return (q,e.args[0])
+                    if st is None:
+                        continue
+                    states[q] = st
+                if q not in pending:
+                    work.append(q)
+                    pending.add(q)
+        except Reject as e:
+            if e.args[0]==VERIFY_UNSUPPORTED:
+                return unproven or (pc,e.args[0])
+            return (pc,e.args[0])
+    return unproven
+
+def verify(P,size):
+    """ Returns None if program P is verified, otherwise the pair
+        (instruction address, reason): the first malformed instruction
+        found (reason in MALFORMED), or else the first one whose checks
+        may fail.
+    """
+    enabled = gc.isenabled()
+    gc.disable()    # the states form no cycles: collecting is wasted work
+    try:
+        return walk(P,size)
+    finally:
+        if enabled:
+            gc.enable()
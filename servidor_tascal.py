@@ -0,0 +1,279 @@
+# Servidor local de compilação e execução Tascal -> MEPA
+# Um processo de longa duração escuta num socket Unix e mantém trabalhadores "quentes",
+# com lexer, parser (tabelas do PLY) e interpretador MEPA já carregados, evitando a
+# partida a frio de main.py e de mepa_pt.py a cada execução.
+#
+# Protocolo: uma linha JSON por pedido e uma linha JSON por resposta.
+#   {"op": "compile", "source": "<programa Tascal>"}
+#   {"op": "run", "program": "<código MEPA>", "input": "<entrada>", "options": {...}}
+#   {"op": "compile+run", "source": "...", "input": "...", "options": {...}}
+#   {"op": "stats"}  -> latências p50/p99 (ms) por operação
+# Respostas: "ok", "diagnostics" (erros de compilação), "mepa" (código gerado),
+# "status", "output", "messages" e "instructions" (execução), "ms" (latência).
+#
+# Uso:
+#   py servidor_tascal.py serve [--socket <arquivo>] [--workers <n>]
+#   py servidor_tascal.py compile|run|compile+run <arquivo> [--socket <arquivo>] [--limit <n>] < entrada
+#   py servidor_tascal.py stats [--socket <arquivo>]
+import sys, os, io, json, time, getopt, socket, socketserver, threading, tempfile, collections, contextlib
+import multiprocessing
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIR)
+sys.path.insert(1, os.path.join(DIR, "mepa"))
+os.environ.setdefault("MEPA_LANG", "pt")  # o gerador emite mnemônicos em português
+
+SOCKET_PADRAO = os.path.join(tempfile.gettempdir(), f"tascal-{os.getuid()}.sock")
+JANELA = 10000  # latências mais recentes guardadas por operação
+
+# Opções do interpretador aceitas nos pedidos (as demais ficam com o valor padrão)
+OPCOES_VM = ("limit", "timeout", "cputime", "stacksize", "memlimit", "engine", "intwidth", "fuse", "nocheck")
+
+# Valores máximos das opções de orçamento de um pedido, também quando omitidas
+# (instruções, milissegundos e bytes)
+MAXIMOS = {"limit": 10**8, "timeout": 10000, "cputime": 10000, "memlimit": 64*1024*1024}
+
+OPERACOES = ("compile", "run", "compile+run")
+
+USO = """Uso:
+  py servidor_tascal.py serve [--socket <arquivo>] [--workers <n>]
+  py servidor_tascal.py compile|run|compile+run <arquivo> [--socket <arquivo>] [--limit <n>] < entrada
+  py servidor_tascal.py stats [--socket <arquivo>]
+"""
+
+#======================================================================
+# Trabalhadores
+#======================================================================
+
+def carrega(): # Carrega compilador e interpretador (uma vez por processo)
+    global lexico, erros_lexicos, parser, semantico_reset, erros_semanticos, erros_sintaticos
+    global GeradorMEPA, mepa_defs, MepaVM
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        from lexer_tascal_mepa import lexico, erros_lexicos
+        from parser_tascal_mepa import parser, semantico_reset, erros_semanticos, erros_sintaticos
+    from mepa_tascal import GeradorMEPA
+    import mepa_defs
+    from mepa_interp import MepaVM
+
+def inicia(escuta: socket.socket): # Inicializa um trabalhador: só o servidor escuta no socket
+    escuta.close()
+    carrega()
+
+def compila(fonte: str): # Compila programa Tascal; devolve (código MEPA ou None, diagnósticos)
+    semantico_reset()
+    erros_lexicos.clear()
+    erros_semanticos.clear()
+    erros_sintaticos.clear()
+    lexico.lineno = 1
+    with contextlib.redirect_stdout(io.StringIO()): # erros já ficam nas listas
+        arvore = parser.parse(fonte, lexer=lexico)
+    diagnosticos = erros_lexicos + erros_sintaticos + erros_semanticos
+    if arvore is None and not diagnosticos:
+        diagnosticos = ["COMPILAÇÃO FINALIZADA COM ERROS — GERAÇÃO MEPA CANCELADA"]
+    if arvore is None or diagnosticos:
+        return None, list(diagnosticos)
+    gerador = GeradorMEPA()
+    codigo = gerador.gera(arvore)
+    return "\n".join(codigo) + "\n", list(gerador.erros)
+
+def executa(codigo: str, entrada: str, opcoes: dict): # Executa código MEPA; devolve campos da resposta
+    mensagens = io.StringIO()
+    mepa_defs.MESS_FILE = mensagens  # erros na leitura do programa
+    mepa_defs.PROG_FILE = io.StringIO(codigo)
+    saida = io.StringIO()
+    status = "error"
+    vm = None
+    try:
+        P, L = mepa_defs.inputProgram()
+        mepa_defs.fixArgs(P, L)
+        vm = MepaVM(P, L, opcoes, io.StringIO(entrada), saida, mensagens)
+        vm.run()
+        status = vm.status
+    except SystemExit:
+        if vm is not None:
+            status = vm.status or "error"
+    return {"status": status,
+            "output": saida.getvalue(),
+            "messages": mensagens.getvalue(),
+            "instructions": vm.executed if status == "halt" else None}
+
+def opcoes_vm(pedido: dict): # Valida as opções do interpretador de um pedido
+    opcoes = {}
+    for k, v in (pedido.get("options") or {}).items():
+        if k not in OPCOES_VM:
+            raise ValueError(f"opção não permitida: {k}")
+        if k in mepa_defs.INT_OPTIONS:
+            if not isinstance(v, int) or v <= 0:
+                raise ValueError(f"valor inválido para {k}: {v}")
+        elif k in mepa_defs.CHOICE_OPTIONS:
+            if v not in mepa_defs.CHOICE_OPTIONS[k]:
+                raise ValueError(f"valor inválido para {k}: {v}")
+        else:
+            v = bool(v)
+        opcoes[k] = v
+    for k, maximo in MAXIMOS.items():
+        v = opcoes.get(k, mepa_defs.OPTIONS_DICT[k])
+        opcoes[k] = maximo if v is None else min(v, maximo)
+    return opcoes
+
+def atende(pedido: dict): # Atende um pedido num trabalhador
+    op = pedido.get("op")
+    try:
+        opcoes = opcoes_vm(pedido)
+    except ValueError as e:
+        return {"ok": False, "diagnostics": [str(e)]}
+    resposta = {"ok": True}
+    if op in ("compile", "compile+run"):
+        codigo, diagnosticos = compila(pedido.get("source", ""))
+        resposta["diagnostics"] = diagnosticos
+        if codigo is None:
+            resposta["ok"] = False
+            return resposta
+        resposta["mepa"] = codigo
+    else:
+        codigo = pedido.get("program", "")
+    if op in ("run", "compile+run"):
+        resposta.update(executa(codigo, pedido.get("input", ""), opcoes))
+        resposta["ok"] = resposta["status"] == "halt"
+    return resposta
+
+#======================================================================
+# Servidor
+#======================================================================
+
+class Latencias: # Contadores de latência por operação (janela das mais recentes)
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.amostras = collections.defaultdict(lambda: collections.deque(maxlen=JANELA))
+        self.total = collections.Counter()
+
+    def registra(self, op: str, ms: float):
+        with self.trava:
+            self.amostras[op].append(ms)
+            self.total[op] += 1
+
+    def resumo(self): # p50 e p99 (posto mais próximo) de cada operação
+        with self.trava:
+            res = {}
+            for op, amostras in self.amostras.items():
+                ordenadas = sorted(amostras)
+                n = len(ordenadas)
+                res[op] = {"count": self.total[op],
+                           "p50_ms": round(ordenadas[max(0, -(-50 * n // 100) - 1)], 3),
+                           "p99_ms": round(ordenadas[max(0, -(-99 * n // 100) - 1)], 3)}
+            return res
+
+class Atendente(socketserver.StreamRequestHandler): # Uma conexão: pedidos até o cliente fechar
+    def handle(self):
+        for linha in self.rfile:
+            if not linha.strip():
+                continue
+            t0 = time.perf_counter()
+            try:
+                pedido = json.loads(linha)
+                op = pedido.get("op")
+            except (ValueError, AttributeError):
+                pedido, op = None, None
+            if op == "stats":
+                resposta = {"ok": True, "stats": self.server.latencias.resumo()}
+            elif op in OPERACOES:
+                try:
+                    resposta = self.server.trabalhadores.apply(atende, (pedido,))
+                except Exception as e: # falha inesperada no trabalhador
+                    resposta = {"ok": False, "diagnostics": [f"erro interno: {e!r}"]}
+            else:
+                resposta = {"ok": False, "diagnostics": ["pedido inválido"]}
+            ms = (time.perf_counter() - t0) * 1000
+            if op in OPERACOES:
+                self.server.latencias.registra(op, ms)
+            resposta["ms"] = round(ms, 3)
+            self.wfile.write((json.dumps(resposta, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class Servidor(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(caminho: str, trabalhadores: int): # Escuta em 'caminho' até ser interrompido
+    if os.path.exists(caminho):
+        os.unlink(caminho)
+    carrega()  # os trabalhadores herdam os módulos já carregados
+    servidor = Servidor(caminho, Atendente)
+    servidor.trabalhadores = multiprocessing.get_context("fork").Pool(trabalhadores, inicia,
+                                                                      (servidor.socket,))
+    servidor.latencias = Latencias()
+    print(f"Servidor Tascal em {caminho} ({trabalhadores} trabalhadores)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.trabalhadores.terminate()
+        servidor.server_close()
+        os.unlink(caminho)
+
+#======================================================================
+# Cliente
+#======================================================================
+
+def pede(caminho: str, pedido: dict): # Envia um pedido e devolve a resposta
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(caminho)
+        arquivo = s.makefile("rwb")
+        arquivo.write((json.dumps(pedido, ensure_ascii=False) + "\n").encode("utf-8"))
+        arquivo.flush()
+        return json.loads(arquivo.readline())
+
+def cliente(op: str, nome, caminho: str, opcoes: dict): # Pedido pela linha de comando
+    pedido = {"op": op}
+    if op != "stats":
+        try:
+            with open(nome, "r", encoding="utf-8") as f:
+                texto = f.read()
+        except FileNotFoundError:
+            print(f"Erro: Arquivo '{nome}' não encontrado.")
+            return 1
+        pedido["program" if op == "run" else "source"] = texto
+        if op != "compile":
+            pedido["input"] = sys.stdin.read()
+            pedido["options"] = opcoes
+    resposta = pede(caminho, pedido)
+    if op == "stats":
+        print(json.dumps(resposta["stats"], indent=2))
+        return 0
+    for d in resposta.get("diagnostics", []):
+        print(d, file=sys.stderr)
+    if op == "compile" and "mepa" in resposta:
+        sys.stdout.write(resposta["mepa"])
+    sys.stdout.write(resposta.get("output", ""))
+    sys.stderr.write(resposta.get("messages", ""))
+    return 0 if resposta["ok"] else 1
+
+def uso():
+    print(USO, end="")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "", ["socket=", "workers=", "limit="])
+    except getopt.GetoptError:
+        uso()
+    caminho = SOCKET_PADRAO
+    trabalhadores = os.cpu_count() or 1
+    opcoes = {}
+    try:
+        for o, a in opts:
+            if o == "--socket":
+                caminho = a
+            elif o == "--workers":
+                trabalhadores = int(a)
+            elif o == "--limit":
+                opcoes["limit"] = int(a)
+    except ValueError:
+        uso()
+    if not args or args[0] not in ("serve", "stats") + OPERACOES or \
+       (args[0] in OPERACOES) != (len(args) == 2):
+        uso()
+    if args[0] == "serve":
+        serve(caminho, trabalhadores)
+    else:
+        sys.exit(cliente(args[0], args[1] if len(args) > 1 else None, caminho, opcoes))